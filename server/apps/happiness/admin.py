@@ -1,18 +1,206 @@
-from django.contrib import admin
+import codecs
+import csv
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.db import connections, transaction
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.timezone import now, timedelta
+
+from .models import LEVELS, Happiness, Team, UserProfile
+from .services import (
+    adjust_tally,
+    annotate_team_stats,
+    get_average_happiness,
+    get_team_tally,
+    rebuild_tallies,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that takes the number of rows of an unfiltered table from the
+    planner statistics on Postgres, instead of counting them on every page.
+    """
+
+    # Below this many rows, counting is cheap and the estimate least accurate
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        estimate = _estimate_count(self.object_list)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            return estimate
+        return super().count
+
+
+def _estimate_count(queryset) -> int:
+    query = getattr(queryset, 'query', None)
+    if query is None or query.where or query.distinct:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row else None
+
+
+class LevelFilter(admin.SimpleListFilter):
+    """ Filter by level, without reading the distinct levels of the table. """
+
+    title = 'level'
+    parameter_name = 'level'
+
+    def lookups(self, request, model_admin):
+        return [(str(level), str(level)) for level in LEVELS]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(level=self.value())
+        return queryset
+
+
+def _dates_of(queryset) -> list:
+    return list(queryset.order_by().values_list('date', flat=True).distinct())
+
+
+def delete_entries(modeladmin, request, queryset):
+    """
+    Delete the entries in one statement once confirmed, on a page that shows
+    how many there are rather than listing them.
+    """
+    if request.POST.get('post'):
+        count = queryset.count()
+        modeladmin.delete_queryset(request, queryset)
+        modeladmin.message_user(request, f'Deleted {count} entries.')
+        return None
+
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': 'Are you sure?',
+        'opts': modeladmin.model._meta,
+        'count': EstimatedCountPaginator(queryset, 1).count,
+        'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', '0'),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    }
+    return TemplateResponse(
+        request, 'admin/happiness/delete_entries_confirmation.html', context
+    )
+
+
+delete_entries.short_description = 'Delete selected entries'
+delete_entries.allowed_permissions = ('delete',)
+
 
-from .models import Happiness, Team, UserProfile
+def _set_level_action(level: int):
+    def set_level(modeladmin, request, queryset):
+        with transaction.atomic():
+            dates = _dates_of(queryset)
+            count = queryset.update(level=level)
+            rebuild_tallies(dates)
+        modeladmin.message_user(
+            request, f'Set the level of {count} entries to {level}.'
+        )
+
+    set_level.__name__ = f'set_level_{level}'
+    set_level.short_description = f'Set level of selected entries to {level}'
+    set_level.allowed_permissions = ('change',)
+    return set_level
 
 
 @admin.register(Happiness)
 class HappinessAdmin(admin.ModelAdmin):
-    list_display = ('id', 'date', 'level', 'user_id')
+    list_display = ('id', 'date', 'level', 'user')
+    list_select_related = ('user',)
+    list_filter = (LevelFilter, 'user__userprofile__team')
+    date_hierarchy = 'date'
+    autocomplete_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [delete_entries] + [_set_level_action(level) for level in LEVELS]
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Lists every selected entry on its confirmation page
+        actions.pop('delete_selected', None)
+        return actions
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            previous = Happiness.objects.select_related('user__userprofile').get(
+                pk=obj.pk
+            )
+            adjust_tally(previous.user, previous.date, previous.level, -1)
+        super().save_model(request, obj, form, change)
+        adjust_tally(obj.user, obj.date, obj.level)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        adjust_tally(obj.user, obj.date, obj.level, -1)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            dates = _dates_of(queryset)
+            super().delete_queryset(request, queryset)
+            rebuild_tallies(dates)
+
+
+class StatsPeriodFilter(admin.SimpleListFilter):
+    """ Annotate the teams with their stats for the chosen period. """
+
+    title = 'stats period'
+    parameter_name = 'stats_period'
+    days = {'week': 7, 'month': 30}
+
+    def lookups(self, request, model_admin):
+        return [
+            ('yesterday', 'Yesterday'),
+            ('week', 'Last 7 days'),
+            ('month', 'Last 30 days'),
+        ]
+
+    def choices(self, changelist):
+        choices = list(super().choices(changelist))
+        choices[0]['display'] = 'Today'
+        return choices
+
+    def queryset(self, request, queryset):
+        today = now().date()
+        if self.value() == 'yesterday':
+            start = end = today - timedelta(days=1)
+        else:
+            end = today
+            start = today - timedelta(days=self.days.get(self.value(), 1) - 1)
+        return annotate_team_stats(queryset, start, end)
 
 
 @admin.register(Team)
 class TeamAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
+    list_display = ('id', 'name', 'tally', 'average')
+    list_filter = (StatsPeriodFilter,)
+
+    def tally(self, obj):
+        tally = get_team_tally(obj)
+        return ', '.join(f'{level}: {count}' for level, count in tally.items())
+
+    def average(self, obj):
+        average = get_average_happiness(get_team_tally(obj))
+        return round(average, 2) if average is not None else None
 
 
 User = get_user_model()
@@ -20,6 +208,12 @@ admin.site.unregister(User)
 @admin.register(User)
 class UserProfileAdmin(UserAdmin):
     list_display = UserAdmin.list_display + ('team',)
+    list_filter = UserAdmin.list_filter + ('userprofile__team',)
+    list_select_related = ('userprofile__team',)
+    change_list_template = 'admin/happiness/user_change_list.html'
+
+    # Of the invalid rows of a provisioning, the number listed
+    max_provision_errors = 20
 
     def change_view(self, request, object_id, form_url='', extra_context=None):
         self.inlines = [UserProfileInline]
@@ -28,8 +222,71 @@ class UserProfileAdmin(UserAdmin):
     def team(self, obj):
         return obj.userprofile.team.name if obj.userprofile.team else None
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('userprofile__team')
+    team.admin_order_field = 'userprofile__team__name'
+
+    def get_urls(self):
+        return [
+            path(
+                'provision/',
+                self.admin_site.admin_view(self.provision_view),
+                name='auth_user_provision',
+            )
+        ] + super().get_urls()
+
+    def provision_view(self, request):
+        """ Create users in bulk from an uploaded CSV file. """
+        # Imported on first use rather than when workers start, like the
+        # ingest of the bulk import
+        from .provisioning import provision_users
+
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ProvisionUsersForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            lines = codecs.iterdecode(form.cleaned_data['file'], 'utf-8-sig')
+            result = provision_users(
+                csv.DictReader(lines),
+                workers=settings.HAPPINESS_ADMIN_PROVISION_WORKERS,
+            )
+            self.message_user(
+                request,
+                f'Created {result["created"]} users and {result["teams_created"]} '
+                f'teams, with {len(result["errors"])} invalid rows.',
+                messages.SUCCESS,
+            )
+            for error in result['errors'][: self.max_provision_errors]:
+                self.message_user(
+                    request, f'Row {error["row"]}: {error["errors"]}', messages.WARNING
+                )
+            return HttpResponseRedirect(reverse('admin:auth_user_changelist'))
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Provision users',
+            'opts': self.model._meta,
+            'form': form,
+        }
+        return TemplateResponse(
+            request, 'admin/happiness/provision_users.html', context
+        )
+
+
+class ProvisionUsersForm(forms.Form):
+    file = forms.FileField(help_text='A CSV file of users, encoded in UTF-8.')
+
+    def clean_file(self):
+        # Decoded once before any user is created, rather than failing part
+        # way through the upload
+        file = self.cleaned_data['file']
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        try:
+            for chunk in file.chunks():
+                decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            raise forms.ValidationError('The file is not encoded in UTF-8.')
+        file.seek(0)
+        return file
 
 
 class UserProfileInline(admin.StackedInline):
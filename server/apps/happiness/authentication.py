@@ -0,0 +1,52 @@
+from django.core.cache import caches
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+token_cache = caches['tokens']
+
+
+def _token_cache_key(key: str) -> str:
+    return f'token:{key}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Authenticate API clients by token, keeping the user of each token in the
+    `tokens` cache. The cache is local to the process, so that a hit takes
+    neither a query nor a round trip, and its entries expire after its
+    timeout.
+
+    The user's profile isn't cached, as a team change only evicts the tokens
+    of the process making it. It's loaded on first use in each request.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_cache_key(key)
+        cached = token_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        token_cache.set(cache_key, (token.user, token))
+        return token.user, token
+
+
+def evict_token(key: str) -> None:
+    """
+    Forget the cached user of a token. Other processes keep it until it
+    expires.
+    """
+    token_cache.delete(_token_cache_key(key))
+
+
+def evict_user_tokens(user_id: int) -> None:
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        evict_token(key)
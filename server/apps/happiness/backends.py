@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+User = get_user_model()
+
+
+class UserProfileBackend(ModelBackend):
+    """
+    Load the user of a session together with their profile, so that their
+    team is known without another query.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related('userprofile').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,53 @@
+import queue
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LocalBroker:
+    """
+    Publish messages to the subscribers of a topic within this process.
+
+    Each subscriber only keeps the latest message, since stats supersede one
+    another, so a slow subscriber never holds up publishing.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> queue.Queue:
+        subscription = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, topic: str, subscription: queue.Queue) -> None:
+        with self._lock:
+            self._subscriptions[topic].discard(subscription)
+            if not self._subscriptions[topic]:
+                del self._subscriptions[topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        with self._lock:
+            return topic in self._subscriptions
+
+    def publish(self, topic: str, message) -> None:
+        with self._lock:
+            for subscription in self._subscriptions.get(topic, ()):
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+                subscription.put_nowait(message)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Return the broker set by the HAPPINESS_EVENT_BROKER setting.
+    """
+    return import_string(settings.HAPPINESS_EVENT_BROKER)()
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date as Date
+from itertools import islice
+from typing import Iterable, Iterator, Tuple
+
+from .models import Happiness
+
+
+COLUMNS = ['username', 'team', 'date', 'level']
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def export_rows(
+    team_id: int = None,
+    start: Date = None,
+    end: Date = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Tuple]:
+    """
+    Yield a tuple of `COLUMNS` per happiness entry, ordered by date, fetched
+    from the database `chunk_size` rows at a time.
+    """
+    qs = Happiness.objects.all()
+    if team_id is not None:
+        qs = qs.filter(user__userprofile__team_id=team_id)
+    if start is not None:
+        qs = qs.filter(date__gte=start)
+    if end is not None:
+        qs = qs.filter(date__lte=end)
+    return (
+        qs.order_by('date', 'id')
+        .values_list(
+            'user__username', 'user__userprofile__team__name', 'date', 'level'
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _chunks(rows: Iterable[Tuple], size: int) -> Iterator[list]:
+    rows = iter(rows)
+    chunk = list(islice(rows, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, size))
+
+
+def write_csv(
+    rows: Iterable[Tuple], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Yield the CSV of the rows, with a header, a chunk of rows at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_columnar(
+    rows: Iterable[Tuple], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Yield the rows as lines of JSON, each holding a block of up to
+    `chunk_size` rows as one list of values per column.
+
+    Within a block, the usernames and team names are stored once each, with
+    the rows referring to them by index, which makes the output much smaller
+    than CSV as every user has many entries.
+    """
+    for chunk in _chunks(rows, chunk_size):
+        usernames, user_ids = _encode_dictionary(row[0] for row in chunk)
+        teams, team_ids = _encode_dictionary(row[1] for row in chunk)
+        block = {
+            'rows': len(chunk),
+            'username': {'dictionary': usernames, 'indices': user_ids},
+            'team': {'dictionary': teams, 'indices': team_ids},
+            'date': [row[2].isoformat() for row in chunk],
+            'level': [row[3] for row in chunk],
+        }
+        yield json.dumps(block, separators=(',', ':')) + '\n'
+
+
+def _encode_dictionary(values: Iterable) -> Tuple[list, list]:
+    dictionary = {}
+    indices = [dictionary.setdefault(value, len(dictionary)) for value in values]
+    return list(dictionary), indices
+
+
+WRITERS = {
+    'csv': write_csv,
+    'columnar': write_columnar,
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'columnar': 'application/x-ndjson',
+}
+
+EXTENSIONS = {
+    'csv': 'csv',
+    'columnar': 'jsonl',
+}
+
+
+def gzip_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    """
+    Compress the text chunks into a gzip stream, as they come.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,145 @@
+import csv
+import json
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Happiness, UserProfile
+from .serializers import HappinessRecordSerializer
+from .services import apply_tally_changes, insert_happiness
+
+
+User = get_user_model()
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def read_csv_records(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """
+    Read records from CSV lines with a header of `username,date,level`.
+    """
+    return csv.DictReader(lines)
+
+
+def read_jsonl_records(lines: Iterable[str]) -> Iterator[Dict[str, any]]:
+    """
+    Read records from lines of JSON objects. A line that can't be read is
+    yielded as the ValueError describing it, so that it's reported as an
+    error of that row.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f'Invalid JSON: {e}')
+
+
+def import_happiness(
+    records: Iterable, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, any]:
+    """
+    Create or update the happiness entries of the records, in a transaction
+    per chunk of records.
+
+    Invalid records don't stop the import, but are reported with their row
+    number under `errors`. Of several records for the same user and date,
+    the last one wins.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    chunk = []
+    for row, record in enumerate(records, 1):
+        if not isinstance(record, dict):
+            message = str(record) if isinstance(record, Exception) else None
+            result['errors'].append(
+                {'row': row, 'errors': [message or 'Expected an object.']}
+            )
+            continue
+        serializer = HappinessRecordSerializer(data=record)
+        if not serializer.is_valid():
+            result['errors'].append({'row': row, 'errors': serializer.errors})
+            continue
+        chunk.append((row, serializer.validated_data))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, result)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, result)
+    result['errors'].sort(key=lambda error: error['row'])
+    return result
+
+
+def _import_chunk(chunk: List[Tuple[int, Dict]], result: Dict[str, any]) -> None:
+    users = dict(
+        User.objects.filter(
+            username__in={data['username'] for row, data in chunk}
+        ).values_list('username', 'id')
+    )
+    levels = {}
+    for row, data in chunk:
+        user_id = users.get(data['username'])
+        if user_id is None:
+            result['errors'].append(
+                {'row': row, 'errors': {'username': ['User does not exist.']}}
+            )
+            continue
+        levels[(user_id, data['date'])] = data['level']
+    if not levels:
+        return
+
+    user_ids = {user_id for user_id, date in levels}
+    team_ids = dict(
+        UserProfile.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'team_id'
+        )
+    )
+    tally_changes = Counter()
+    with transaction.atomic():
+        existing = {
+            (entry.user_id, entry.date): entry
+            for entry in Happiness.objects.select_for_update().filter(
+                user_id__in=user_ids, date__in={date for user_id, date in levels}
+            )
+        }
+        new_levels = {}
+        changed_entries = []
+
+        def change(entry, level):
+            team_id = team_ids.get(entry.user_id)
+            tally_changes[(team_id, entry.date, entry.level)] -= 1
+            tally_changes[(team_id, entry.date, level)] += 1
+            entry.level = level
+            changed_entries.append(entry)
+
+        for key, level in levels.items():
+            entry = existing.get(key)
+            if entry is None:
+                new_levels[key] = level
+            elif entry.level != level:
+                change(entry, level)
+
+        inserted = insert_happiness(
+            (user_id, date, level) for (user_id, date), level in new_levels.items()
+        )
+        for user_id, date in inserted:
+            level = new_levels[(user_id, date)]
+            tally_changes[(team_ids.get(user_id), date, level)] += 1
+        # Entries created since the select above are updated like the others
+        conflicting = new_levels.keys() - inserted
+        if conflicting:
+            for entry in Happiness.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, date in conflicting},
+                date__in={date for user_id, date in conflicting},
+            ):
+                key = (entry.user_id, entry.date)
+                if key in conflicting and entry.level != new_levels[key]:
+                    change(entry, new_levels[key])
+
+        Happiness.objects.bulk_update(changed_entries, ['level'])
+        apply_tally_changes(tally_changes)
+
+    result['created'] += len(inserted)
+    result['updated'] += len(changed_entries)
@@ -0,0 +1,73 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.happiness.exports import (
+    DEFAULT_CHUNK_SIZE,
+    WRITERS,
+    export_rows,
+    gzip_stream,
+)
+
+
+def date_argument(value):
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(value)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Export the happiness entries, with the username and team of each, as '
+        'CSV or as blocks of columns in JSON lines.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='File to write, or - for standard output.',
+        )
+        parser.add_argument(
+            '--format', choices=sorted(WRITERS), default='csv', help='Output format.'
+        )
+        parser.add_argument('--team', type=int, help='Only export this team id.')
+        parser.add_argument(
+            '--start', type=date_argument, help='First date to export, as YYYY-MM-DD.'
+        )
+        parser.add_argument(
+            '--end', type=date_argument, help='Last date to export, as YYYY-MM-DD.'
+        )
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows fetched and written at a time.',
+        )
+
+    def handle(
+        self, *args, path, format, team, start, end, gzip, chunk_size, **options
+    ):
+        if chunk_size < 1:
+            raise CommandError('The chunk size must be at least 1.')
+        rows = export_rows(team, start, end, chunk_size)
+        content = WRITERS[format](rows, chunk_size)
+        if gzip:
+            content = gzip_stream(content)
+        if path == '-' and gzip:
+            for chunk in content:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        elif path == '-':
+            for chunk in content:
+                self.stdout.write(chunk, ending='')
+        elif gzip:
+            with open(path, 'wb') as f:
+                f.writelines(content)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                f.writelines(content)
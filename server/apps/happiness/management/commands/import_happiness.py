@@ -0,0 +1,61 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.happiness.ingest import (
+    DEFAULT_CHUNK_SIZE,
+    import_happiness,
+    read_csv_records,
+    read_jsonl_records,
+)
+
+
+READERS = {
+    'csv': read_csv_records,
+    'jsonl': read_jsonl_records,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update happiness entries from a CSV or JSON lines file of '
+        'records with a username, date and level.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input.')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Format of the file. Defaults to the file extension.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of records imported per transaction.',
+        )
+
+    def handle(self, *args, path, format=None, chunk_size, **options):
+        if not format:
+            format = os.path.splitext(path)[1].lstrip('.').lower()
+            if format not in READERS:
+                raise CommandError('Unknown file format, provide it with --format.')
+        if chunk_size < 1:
+            raise CommandError('The chunk size must be at least 1.')
+
+        if path == '-':
+            result = import_happiness(READERS[format](sys.stdin), chunk_size)
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                result = import_happiness(READERS[format](f), chunk_size)
+
+        for error in result['errors']:
+            self.stderr.write(f'Row {error["row"]}: {error["errors"]}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {result["created"]} and updated {result["updated"]} '
+                f'entries, with {len(result["errors"])} invalid rows.'
+            )
+        )
@@ -0,0 +1,51 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.happiness.provisioning import DEFAULT_CHUNK_SIZE, provision_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users, with their teams, from a CSV file with a header of '
+        'username and any of email, password, first_name, last_name and team.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of users created per transaction.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help=(
+                'Number of processes hashing passwords. Defaults to the number '
+                'of CPUs, 0 hashes them in this process.'
+            ),
+        )
+
+    def handle(self, *args, path, chunk_size, workers=None, **options):
+        if chunk_size < 1:
+            raise CommandError('The chunk size must be at least 1.')
+        if workers is not None and workers < 0:
+            raise CommandError('The number of workers must not be negative.')
+
+        if path == '-':
+            result = provision_users(csv.DictReader(sys.stdin), chunk_size, workers)
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                result = provision_users(csv.DictReader(f), chunk_size, workers)
+
+        for error in result['errors']:
+            self.stderr.write(f'Row {error["row"]}: {error["errors"]}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {result["created"]} users and {result["teams_created"]} '
+                f'teams, with {len(result["errors"])} invalid rows.'
+            )
+        )
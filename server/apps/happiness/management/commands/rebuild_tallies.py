@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.happiness.services import find_tally_mismatches, rebuild_tallies
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily happiness tallies from the happiness entries, '
+        'or only verify them with --verify.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Report tallies that differ from the entries instead of rebuilding.',
+        )
+        parser.add_argument(
+            '--date',
+            action='append',
+            dest='dates',
+            type=date.fromisoformat,
+            help='Limit to a date in the form YYYY-MM-DD. Can be repeated.',
+        )
+
+    def handle(self, *args, verify=False, dates=None, **options):
+        if not verify:
+            rebuild_tallies(dates)
+            self.stdout.write(self.style.SUCCESS('Rebuilt happiness tallies.'))
+            return
+
+        mismatches = find_tally_mismatches(dates)
+        for team_id, day, level, expected, actual in mismatches:
+            self.stdout.write(
+                f'team={team_id or "all"} date={day} level={level}: '
+                f'expected {expected}, found {actual}'
+            )
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} tallies differ from the entries.')
+        self.stdout.write(self.style.SUCCESS('Happiness tallies are up to date.'))
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.happiness.services import snapshot_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Snapshot the stats of completed days that have no fresh snapshot, '
+        'such as yesterday or days edited since their last snapshot.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            action='append',
+            dest='dates',
+            type=date.fromisoformat,
+            help='Limit to a date in the form YYYY-MM-DD. Can be repeated.',
+        )
+
+    def handle(self, *args, dates=None, **options):
+        taken = snapshot_stats(dates)
+        self.stdout.write(self.style.SUCCESS(f'Took {taken} stats snapshots.'))
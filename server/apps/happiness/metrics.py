@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict
+
+
+request_logger = logging.getLogger('apps.happiness.requests')
+slow_query_logger = logging.getLogger('apps.happiness.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_requests = Counter()
+_latency_buckets = Counter()
+_latency_sums = Counter()
+_queries = Counter()
+_query_seconds = Counter()
+_slow_queries = Counter()
+
+_current = threading.local()
+
+
+class QueryRecorder:
+    """
+    An execute wrapper that counts and times the queries of a request, and
+    logs those that take `slow_threshold` seconds or more.
+    """
+
+    def __init__(self, slow_threshold: float = None):
+        self.slow_threshold = slow_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.slow = 0
+        self.cache = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if self.slow_threshold is not None and duration >= self.slow_threshold:
+                self.slow += 1
+                # Without the parameters, which may hold personal data
+                slow_query_logger.warning(
+                    'Slow query',
+                    extra={
+                        'metrics': {
+                            'duration_ms': round(duration * 1000, 3),
+                            'database': context['connection'].alias,
+                            'sql': sql,
+                        }
+                    },
+                )
+
+
+@contextmanager
+def recording(recorder: QueryRecorder):
+    """
+    Make `recorder` count the stats cache lookups of the current thread.
+    """
+    _current.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _current.recorder = None
+
+
+def count_cache_lookup(outcome: str) -> None:
+    recorder = getattr(_current, 'recorder', None)
+    if recorder is not None:
+        recorder.cache[outcome] += 1
+
+
+def record_request(
+    view: str, method: str, status: int, duration: float, recorder: QueryRecorder
+) -> None:
+    with _lock:
+        _requests[(view, method, str(status))] += 1
+        for bucket in LATENCY_BUCKETS:
+            if duration <= bucket:
+                _latency_buckets[(view, bucket)] += 1
+        _latency_buckets[(view, '+Inf')] += 1
+        _latency_sums[view] += duration
+        _queries[view] += recorder.count
+        _query_seconds[view] += recorder.duration
+        _slow_queries[view] += recorder.slow
+
+
+def render_metrics(stats_cache: Dict[str, int]) -> str:
+    """
+    Render the metrics of the process in the Prometheus text format, along
+    with the given stats cache counters.
+    """
+    lines = []
+
+    def family(name, kind, help, samples):
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(samples, key=lambda sample: sample[0]):
+            labels = ','.join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f'{name}{{{labels}}} {value}')
+
+    with _lock:
+        family(
+            'happiness_http_requests_total',
+            'counter',
+            'Requests handled, by view, method and status.',
+            [
+                ((('view', view), ('method', method), ('status', status)), count)
+                for (view, method, status), count in _requests.items()
+            ],
+        )
+        lines.append(
+            '# HELP happiness_http_request_duration_seconds Latency of the '
+            'requests, by view.'
+        )
+        lines.append('# TYPE happiness_http_request_duration_seconds histogram')
+        for view in sorted(_latency_sums):
+            for bucket in LATENCY_BUCKETS + ('+Inf',):
+                lines.append(
+                    f'happiness_http_request_duration_seconds_bucket'
+                    f'{{view="{view}",le="{bucket}"}} '
+                    f'{_latency_buckets[(view, bucket)]}'
+                )
+            lines.append(
+                f'happiness_http_request_duration_seconds_sum{{view="{view}"}} '
+                f'{_latency_sums[view]}'
+            )
+            lines.append(
+                f'happiness_http_request_duration_seconds_count{{view="{view}"}} '
+                f'{_latency_buckets[(view, "+Inf")]}'
+            )
+        for name, help, counter in [
+            ('happiness_db_queries_total', 'Database queries, by view.', _queries),
+            (
+                'happiness_db_query_duration_seconds_total',
+                'Time spent in database queries, by view.',
+                _query_seconds,
+            ),
+            (
+                'happiness_db_slow_queries_total',
+                'Queries over the slow query threshold, by view.',
+                _slow_queries,
+            ),
+        ]:
+            family(
+                name,
+                'counter',
+                help,
+                [((('view', view),), value) for view, value in counter.items()],
+            )
+    family(
+        'happiness_stats_cache_lookups_total',
+        'counter',
+        'Stats cache lookups, by outcome.',
+        [((('outcome', outcome),), count) for outcome, count in stats_cache.items()],
+    )
+    return '\n'.join(lines) + '\n'
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format log records as a line of JSON, with the `metrics` passed through
+    `extra`.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'metrics', {}),
+        }
+        return json.dumps(entry, default=str)
@@ -0,0 +1,59 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the latency, database queries and stats cache lookups of each
+    request, as metrics served by `views.metrics` and as a log line.
+
+    Queries taking HAPPINESS_SLOW_QUERY_MS or more are logged with their SQL.
+    The latency of streamed responses only covers the start of the stream.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.HAPPINESS_SLOW_QUERY_MS
+        recorder = metrics.QueryRecorder(
+            threshold / 1000 if threshold is not None else None
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            stack.enter_context(metrics.recording(recorder))
+            start = time.perf_counter()
+            response = self.get_response(request)
+            duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.view_name if match else None) or 'unmatched'
+        metrics.record_request(
+            view, request.method, response.status_code, duration, recorder
+        )
+        metrics.request_logger.info(
+            '%s %s %s',
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                'metrics': {
+                    'view': view,
+                    'method': request.method,
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 3),
+                    'queries': recorder.count,
+                    'query_ms': round(recorder.duration * 1000, 3),
+                    'slow_queries': recorder.slow,
+                    'cache_hits': recorder.cache['hits'],
+                    'cache_misses': recorder.cache['misses'],
+                }
+            },
+        )
+        return response
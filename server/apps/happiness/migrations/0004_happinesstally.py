@@ -0,0 +1,32 @@
+# Generated by Django 2.2.5 on 2026-10-18 19:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('happiness', '0003_team_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HappinessTally',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('level', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('team', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tallies', to='happiness.Team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='happinesstally',
+            constraint=models.UniqueConstraint(fields=('team', 'date', 'level'), name='unique_team_tally'),
+        ),
+        migrations.AddConstraint(
+            model_name='happinesstally',
+            constraint=models.UniqueConstraint(condition=models.Q(team__isnull=True), fields=('date', 'level'), name='unique_global_tally'),
+        ),
+    ]
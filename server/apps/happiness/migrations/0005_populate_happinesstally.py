@@ -0,0 +1,39 @@
+from collections import Counter
+
+from django.db import migrations
+
+
+def populate_tallies(apps, schema_editor):
+    Happiness = apps.get_model('happiness', 'Happiness')
+    HappinessTally = apps.get_model('happiness', 'HappinessTally')
+
+    counts = Counter()
+    for date, level, team_id in Happiness.objects.values_list(
+        'date', 'level', 'user__userprofile__team_id'
+    ).iterator():
+        if team_id:
+            counts[(team_id, date, level)] += 1
+        counts[(None, date, level)] += 1
+
+    HappinessTally.objects.bulk_create(
+        [
+            HappinessTally(team_id=team_id, date=date, level=level, count=count)
+            for (team_id, date, level), count in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+def clear_tallies(apps, schema_editor):
+    apps.get_model('happiness', 'HappinessTally').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('happiness', '0004_happinesstally'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_tallies, clear_tallies),
+    ]
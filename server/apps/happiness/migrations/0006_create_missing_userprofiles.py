@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_userprofiles(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserProfile = apps.get_model('happiness', 'UserProfile')
+
+    user_ids = User.objects.filter(userprofile__isnull=True).values_list(
+        'id', flat=True
+    )
+    UserProfile.objects.bulk_create(
+        # With the same primary key as `signals.create_userprofile_for_user`
+        [
+            UserProfile(pk=user_id, user_id=user_id)
+            for user_id in user_ids.iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('happiness', '0005_populate_happinesstally'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_userprofiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.5 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('happiness', '0006_create_missing_userprofiles'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='happiness',
+            index=models.Index(fields=['date', 'level'], name='happiness_date_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='happiness',
+            index=models.Index(fields=['date', 'user'], name='happiness_date_user_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.5 on 2026-10-18 19:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('happiness', '0007_happiness_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('stats', models.TextField(blank=True)),
+                ('stale', models.BooleanField(default=False)),
+                ('team', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats_snapshots', to='happiness.Team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statssnapshot',
+            constraint=models.UniqueConstraint(fields=('team', 'date'), name='unique_team_snapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='statssnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(team__isnull=True), fields=('date',), name='unique_global_snapshot'),
+        ),
+    ]
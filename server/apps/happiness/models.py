@@ -2,6 +2,9 @@ from django.db import models
 from django.conf import settings
 
 
+LEVELS = range(1, 6)
+
+
 class Happiness(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     date = models.DateField()
@@ -9,6 +12,10 @@ class Happiness(models.Model):
 
     class Meta:
         unique_together = [['user', 'date']]
+        indexes = [
+            models.Index(fields=['date', 'level'], name='happiness_date_level_idx'),
+            models.Index(fields=['date', 'user'], name='happiness_date_user_idx'),
+        ]
 
 
 class Team(models.Model):
@@ -21,3 +28,58 @@ class Team(models.Model):
 class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True)
+
+
+class HappinessTally(models.Model):
+    """
+    Number of entries per happiness level for a team on a date.
+
+    Rows without a team hold the tally across all users.
+    """
+
+    team = models.ForeignKey(
+        Team, on_delete=models.CASCADE, null=True, related_name='tallies'
+    )
+    date = models.DateField()
+    level = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['team', 'date', 'level'], name='unique_team_tally'
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'level'],
+                condition=models.Q(team__isnull=True),
+                name='unique_global_tally',
+            ),
+        ]
+
+
+class StatsSnapshot(models.Model):
+    """
+    Stats of a team on a completed day, as the JSON of `describe_tally`.
+
+    Rows without a team hold the stats across all users. A snapshot is
+    marked stale when the tallies of its day change, until it's taken again.
+    """
+
+    team = models.ForeignKey(
+        Team, on_delete=models.CASCADE, null=True, related_name='stats_snapshots'
+    )
+    date = models.DateField()
+    stats = models.TextField(blank=True)
+    stale = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['team', 'date'], name='unique_team_snapshot'
+            ),
+            models.UniqueConstraint(
+                fields=['date'],
+                condition=models.Q(team__isnull=True),
+                name='unique_global_snapshot',
+            ),
+        ]
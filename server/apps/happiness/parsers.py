@@ -0,0 +1,36 @@
+import codecs
+
+from django.conf import settings
+
+from rest_framework.parsers import BaseParser
+
+
+class CSVRecordParser(BaseParser):
+    """
+    Parse CSV into a lazy iterator of records, so large uploads are streamed.
+    """
+
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        from .ingest import read_csv_records
+
+        return read_csv_records(_decode(stream, parser_context))
+
+
+class JSONLinesRecordParser(BaseParser):
+    """
+    Parse JSON lines into a lazy iterator of records.
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        from .ingest import read_jsonl_records
+
+        return read_jsonl_records(_decode(stream, parser_context))
+
+
+def _decode(stream, parser_context):
+    encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+    return codecs.getreader(encoding)(stream)
@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import Team, UserProfile
+from .serializers import UserRecordSerializer
+from .services import invalidate_team_sizes
+
+
+User = get_user_model()
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def provision_users(
+    records: Iterable,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = None,
+) -> Dict[str, any]:
+    """
+    Create the users of the records, with their profiles and teams, in a
+    transaction per chunk of records. Teams that don't exist by name are
+    created.
+
+    Users, profiles and teams are created with `bulk_create`, without the
+    signals of saving them one at a time. Passwords are hashed in a pool of
+    `workers` processes, defaulting to one per CPU, or in this process when
+    `workers` is 0.
+
+    Invalid records, and those of existing usernames, are reported with
+    their row number under `errors`, including usernames created by another
+    request while the chunk is provisioned.
+    """
+    result = {'created': 0, 'teams_created': 0, 'errors': []}
+    if workers is None:
+        workers = os.cpu_count()
+    pool = None
+    if workers:
+        # Spawned rather than forked, as forking a threaded server could
+        # leave the children holding locks that are never released
+        pool = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+    try:
+        chunk = []
+        for row, record in enumerate(records, 1):
+            serializer = UserRecordSerializer(data=record)
+            if not serializer.is_valid():
+                result['errors'].append({'row': row, 'errors': serializer.errors})
+                continue
+            chunk.append((row, serializer.validated_data))
+            if len(chunk) >= chunk_size:
+                _provision_chunk(chunk, result, pool)
+                chunk = []
+        if chunk:
+            _provision_chunk(chunk, result, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    result['errors'].sort(key=lambda error: error['row'])
+    return result
+
+
+def _hash_passwords(passwords: List[str], pool: ProcessPoolExecutor) -> List[str]:
+    if pool is None:
+        return [make_password(password or None) for password in passwords]
+    # Unusable passwords take no hashing
+    hashed = [None if password else make_password(None) for password in passwords]
+    todo = [i for i, password in enumerate(passwords) if password]
+    for i, password in zip(todo, pool.map(make_password, [passwords[i] for i in todo])):
+        hashed[i] = password
+    return hashed
+
+
+def _provision_chunk(
+    chunk: List[Tuple[int, Dict]], result: Dict[str, any], pool: ProcessPoolExecutor
+) -> None:
+    records = {}
+    for row, data in chunk:
+        if data['username'] in records:
+            result['errors'].append(
+                {'row': row, 'errors': {'username': ['Duplicate username.']}}
+            )
+            continue
+        records[data['username']] = (row, data)
+    # Checked first to skip hashing their passwords, though they may still
+    # be created concurrently until the users are inserted
+    existing = set(
+        User.objects.filter(username__in=records).values_list('username', flat=True)
+    )
+    for username in existing:
+        _report_existing_user(records.pop(username)[0], result)
+    if not records:
+        return
+
+    hashed = _hash_passwords(
+        [data.get('password') for row, data in records.values()], pool
+    )
+    passwords = dict(zip(records, hashed))
+    team_names = {data['team'] for row, data in records.values() if data.get('team')}
+    with transaction.atomic():
+        team_ids = _get_or_create_teams(team_names, result)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=username,
+                    email=data.get('email', ''),
+                    first_name=data.get('first_name', ''),
+                    last_name=data.get('last_name', ''),
+                    password=passwords[username],
+                )
+                for username, (row, data) in records.items()
+            ),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        # The users created here are told from those of a concurrent request
+        # by their password hash, which is salted, or random when unusable
+        user_ids = []
+        users = User.objects.filter(username__in=records)
+        for username, user_id, password in users.values_list(
+            'username', 'id', 'password'
+        ):
+            if password == passwords[username]:
+                user_ids.append((username, user_id))
+            else:
+                _report_existing_user(records[username][0], result)
+        # With the same primary key as `signals.create_userprofile_for_user`
+        UserProfile.objects.bulk_create(
+            (
+                UserProfile(
+                    pk=user_id,
+                    user_id=user_id,
+                    team_id=team_ids.get(records[username][1].get('team')),
+                )
+                for username, user_id in user_ids
+            ),
+            batch_size=500,
+        )
+        invalidate_team_sizes(set(team_ids.values()) | {None})
+    result['created'] += len(user_ids)
+
+
+def _report_existing_user(row: int, result: Dict[str, any]) -> None:
+    result['errors'].append(
+        {'row': row, 'errors': {'username': ['User already exists.']}}
+    )
+
+
+def _get_or_create_teams(names: Iterable[str], result: Dict[str, any]) -> Dict:
+    """
+    Return the ids of the teams by name, creating those that don't exist.
+    """
+    team_ids = {}
+    # Of teams with the same name, the first one created is used
+    teams = Team.objects.filter(name__in=names).order_by('-id')
+    team_ids.update(teams.values_list('name', 'id'))
+    missing = [name for name in names if name not in team_ids]
+    if missing:
+        Team.objects.bulk_create(Team(name=name) for name in missing)
+        team_ids.update(
+            Team.objects.filter(name__in=missing)
+            .order_by('-id')
+            .values_list('name', 'id')
+        )
+        result['teams_created'] += len(missing)
+    return team_ids
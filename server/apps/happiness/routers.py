@@ -0,0 +1,51 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import HappinessTally
+
+
+_state = threading.local()
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary database within the block, to see its own writes.
+    """
+    previous = getattr(_state, 'use_primary', False)
+    _state.use_primary = True
+    try:
+        yield
+    finally:
+        _state.use_primary = previous
+
+
+class ReplicaRouter:
+    """
+    Send reads of the stats tallies to a random replica of DATABASE_REPLICAS,
+    outside of `use_primary()`, and everything else to the primary database.
+    """
+
+    replica_models = {HappinessTally}
+
+    def db_for_read(self, model, **hints):
+        if (
+            model in self.replica_models
+            and settings.DATABASE_REPLICAS
+            and not getattr(_state, 'use_primary', False)
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,6 +1,10 @@
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.utils.timezone import now
+
 from rest_framework import serializers
 
-from .models import Happiness
+from .models import LEVELS, Happiness, Team
+from .services import get_average_happiness, get_team_tally
 
 
 class HappinessSerializer(serializers.ModelSerializer):
@@ -9,8 +13,116 @@ class HappinessSerializer(serializers.ModelSerializer):
         fields = ['level']
 
     def validate_level(self, value):
-        if value < 1 or value > 5:
+        if value not in LEVELS:
             raise serializers.ValidationError(
-                'Happiness level must be between 1 and 5'
+                f'Happiness level must be between {LEVELS[0]} and {LEVELS[-1]}'
             )
         return value
+
+
+class HappinessRecordSerializer(HappinessSerializer):
+    """ A happiness entry of any user, as imported in bulk. """
+
+    username = serializers.CharField()
+
+    class Meta(HappinessSerializer.Meta):
+        fields = ['username', 'date', 'level']
+
+
+class UserRecordSerializer(serializers.Serializer):
+    """
+    A user to create, as provisioned in bulk. Without a password, the user
+    gets an unusable one and has to reset it.
+    """
+
+    username = serializers.CharField(
+        max_length=150, validators=[UnicodeUsernameValidator()]
+    )
+    email = serializers.EmailField(required=False, allow_blank=True)
+    password = serializers.CharField(
+        required=False, allow_blank=True, trim_whitespace=False
+    )
+    first_name = serializers.CharField(max_length=30, required=False, allow_blank=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    team = serializers.CharField(max_length=150, required=False, allow_blank=True)
+
+
+class StatsRangeSerializer(serializers.Serializer):
+    """ Query parameters of the stats for a range of dates. """
+
+    MAX_DAYS = 3660
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    bucket = serializers.ChoiceField(['day', 'week', 'month'], default='day')
+
+    def validate(self, data):
+        days = (data['end'] - data['start']).days
+        if days < 0:
+            raise serializers.ValidationError('The end must not be before the start.')
+        if days >= self.MAX_DAYS:
+            raise serializers.ValidationError(
+                f'The range must not be longer than {self.MAX_DAYS} days.'
+            )
+        return data
+
+
+class StatsPeriodSerializer(serializers.Serializer):
+    """
+    Query parameters of stats for either a `date` or a `start` and `end`,
+    defaulting to today.
+    """
+
+    date = serializers.DateField(required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if not data:
+            today = now().date()
+            return {'start': today, 'end': today}
+        if 'date' in data:
+            if 'start' in data or 'end' in data:
+                raise serializers.ValidationError(
+                    'Provide either a date, or a start and an end.'
+                )
+            return {'start': data['date'], 'end': data['date']}
+        if 'start' not in data or 'end' not in data:
+            raise serializers.ValidationError(
+                'Provide either a date, or a start and an end.'
+            )
+        if data['end'] < data['start']:
+            raise serializers.ValidationError('The end must not be before the start.')
+        return data
+
+
+class ExportSerializer(serializers.Serializer):
+    """ Query parameters of an export of the happiness entries. """
+
+    team = serializers.IntegerField(required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    output = serializers.ChoiceField(['csv', 'columnar'], default='csv')
+    gzip = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['end'] < data['start']:
+            raise serializers.ValidationError('The end must not be before the start.')
+        return data
+
+
+class TeamStatsSerializer(serializers.ModelSerializer):
+    """ Stats of a team annotated by `services.annotate_team_stats`. """
+
+    tally = serializers.SerializerMethodField()
+    average = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Team
+        fields = ['id', 'name', 'tally', 'average']
+
+    def get_tally(self, team):
+        return get_team_tally(team)
+
+    def get_average(self, team):
+        return get_average_happiness(get_team_tally(team))
@@ -1,37 +1,463 @@
-from typing import List, Dict
+import json
+import math
+import threading
+import uuid
+from collections import Counter
+from datetime import date as Date
+from itertools import groupby
+from typing import Iterable, Iterator, List, Dict, Set, Tuple
 
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_date
 from django.utils.timezone import now
-from django.db.models import Count
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    IntegrityError,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import Avg, Count, F, FilteredRelation, Max, Q, QuerySet, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
 
-from .models import Happiness
+from . import metrics
+from .events import get_broker
+from .models import LEVELS, Happiness, HappinessTally, StatsSnapshot, UserProfile
+from .routers import use_primary
+
+
+_stats_cache_counters = Counter()
+_stats_cache_counters_lock = threading.Lock()
+
+_stats_in_flight = {}
+_stats_in_flight_lock = threading.Lock()
 
 
 def get_stats(user, date: str = None) -> Dict[str, any]:
-    if not date:
-        date = now().date()
-    tally = get_happiness_tally(user, date)
-    average = get_average_happiness(tally)
-    return {'tally': tally, 'average': average}
+    date = _as_date(date) if date else now().date()
+    return get_team_stats(get_team_id(user), date)
+
+
+def _compute_stats(
+    team_id: int, date: Date, snapshot_horizon: Date = None
+) -> Dict[str, any]:
+    # Snapshots are only looked up up to the last day snapshot_stats covered
+    if snapshot_horizon is not None and date <= snapshot_horizon:
+        snapshot = _get_snapshot(team_id, date)
+        if snapshot is not None:
+            return snapshot
+    return describe_tally(_get_tally(team_id, date))
+
+
+def get_team_stats(team_id: int, date: Date) -> Dict[str, any]:
+    """
+    Return the stats of a team, or of all users for a team id of None.
+    """
+    return get_team_stats_and_version(team_id, date)[0]
+
+
+def get_team_stats_and_version(team_id: int, date: Date) -> Tuple[Dict, str]:
+    """
+    Return the stats of a team, or of all users for a team id of None, with
+    a token that changes whenever they do.
+
+    They come from the cache when they were stored under the current
+    version of the (team, date) key, or are computed and stored. Both keys,
+    the team size and the snapshot horizon are read in one lookup, so a hit
+    costs a single cache call. Concurrent misses of the same version share
+    one computation.
+    """
+    stats_key, version_key = _stats_cache_keys(team_id, date)
+    team_size_key = _team_size_cache_key(team_id)
+    cached = cache.get_many(
+        [stats_key, version_key, team_size_key, _SNAPSHOT_HORIZON_CACHE_KEY]
+    )
+    version = cached.get(version_key)
+    if version is not None and cached.get(stats_key, (None,))[0] == version:
+        _count_stats_cache('hits')
+        stats = cached[stats_key][1]
+    else:
+        _count_stats_cache('misses')
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(version_key, version, None):
+                version = cache.get(version_key, version)
+
+        def compute():
+            horizon = cached.get(_SNAPSHOT_HORIZON_CACHE_KEY)
+            if horizon is None and date < now().date():
+                horizon = _load_snapshot_horizon()
+            stats = _compute_stats(team_id, date, horizon)
+            cache.set(stats_key, (version, stats), _stats_cache_timeout())
+            return stats
+
+        stats = _single_flight((stats_key, version), compute)
+
+    team_size = cached.get(team_size_key)
+    if team_size is None:
+        team_size = _cache_team_size(team_id)
+    stats = {**stats, 'participation': get_participation(stats['count'], team_size)}
+    return stats, f'{version}-{team_size}'
+
+
+def get_stats_version(team_id: int, date: Date) -> str:
+    """
+    Return the token of `get_team_stats_and_version` from the cache, without
+    computing the stats, or None when it isn't cached.
+    """
+    version_key = _stats_cache_keys(team_id, date)[1]
+    team_size_key = _team_size_cache_key(team_id)
+    cached = cache.get_many([version_key, team_size_key])
+    if version_key not in cached or team_size_key not in cached:
+        return None
+    return f'{cached[version_key]}-{cached[team_size_key]}'
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _single_flight(key, compute):
+    """
+    Return the result of `compute()`, sharing a single call between the
+    threads of the process that ask for the same key at the same time.
+    """
+    with _stats_in_flight_lock:
+        flight = _stats_in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _stats_in_flight[key] = _Flight()
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = compute()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _stats_in_flight_lock:
+            del _stats_in_flight[key]
+        flight.done.set()
+
+
+def _stats_cache_timeout() -> int:
+    if router.db_for_read(HappinessTally) != DEFAULT_DB_ALIAS:
+        return settings.HAPPINESS_REPLICA_STATS_CACHE_TIMEOUT
+    return settings.HAPPINESS_STATS_CACHE_TIMEOUT
+
+
+def _stats_cache_keys(team_id: int, date: Date) -> Tuple[str, str]:
+    scope = team_id or 'all'
+    return (
+        f'happiness:stats:{scope}:{date.isoformat()}',
+        f'happiness:stats-version:{scope}:{date.isoformat()}',
+    )
+
+
+# The last date with stats snapshots, or `Date.min` without any, set by
+# `snapshot_stats` and read back from the snapshots when the cache lost it
+_SNAPSHOT_HORIZON_CACHE_KEY = 'happiness:snapshot-horizon'
+
+
+def _team_size_cache_key(team_id: int) -> str:
+    return f'happiness:team-size:{team_id or "all"}'
+
+
+def get_team_size(team_id: int) -> int:
+    """
+    Return the number of members of a team, or of users for a team id of None.
+    """
+    profiles = UserProfile.objects.all()
+    if team_id:
+        profiles = profiles.filter(team_id=team_id)
+    return profiles.count()
+
+
+def _cache_team_size(team_id: int) -> int:
+    team_size = get_team_size(team_id)
+    cache.set(
+        _team_size_cache_key(team_id), team_size, settings.HAPPINESS_STATS_CACHE_TIMEOUT
+    )
+    return team_size
+
+
+def invalidate_team_sizes(team_ids: Iterable[int]) -> None:
+    """
+    Forget the cached sizes of the teams, where a team id of None stands for
+    all users, now and again on commit.
+    """
+    keys = {_team_size_cache_key(team_id) for team_id in team_ids}
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_stats(keys: Iterable[Tuple[int, Date]]) -> None:
+    """
+    Give a new version to the cached stats of each (team id, date) pair, where
+    a team id of None stands for all users.
+    """
+    keys = {(team_id, _as_date(date)) for team_id, date in keys}
+    if not keys:
+        return
+    _bump_stats_versions(keys)
+
+    def on_commit():
+        # Bump again, since a concurrent request may have cached stats
+        # computed from the data before the commit in the meantime.
+        _bump_stats_versions(keys)
+        with use_primary():
+            publish_stats(keys)
+
+    transaction.on_commit(on_commit)
+
+
+def _bump_stats_versions(keys: Iterable[Tuple[int, Date]]) -> None:
+    cache.set_many(
+        {_stats_cache_keys(*key)[1]: uuid.uuid4().hex for key in keys}, None
+    )
+
+
+def stats_topic(team_id: int, date: Date) -> str:
+    return f'stats:{team_id or "all"}:{date.isoformat()}'
+
+
+def publish_stats(keys: Iterable[Tuple[int, Date]]) -> None:
+    """
+    Publish the stats of each (team id, date) pair that has subscribers, so
+    that they're computed once per change whatever the number of subscribers.
+    """
+    broker = get_broker()
+    for team_id, date in keys:
+        topic = stats_topic(team_id, date)
+        if broker.has_subscribers(topic):
+            broker.publish(topic, get_team_stats(team_id, date))
+
+
+def _count_stats_cache(outcome: str) -> None:
+    with _stats_cache_counters_lock:
+        _stats_cache_counters[outcome] += 1
+    metrics.count_cache_lookup(outcome)
+
+
+def get_stats_cache_counters() -> Dict[str, int]:
+    """
+    Return the number of stats cache hits and misses in this process.
+    """
+    with _stats_cache_counters_lock:
+        return {
+            'hits': _stats_cache_counters['hits'],
+            'misses': _stats_cache_counters['misses'],
+        }
+
+
+def _as_date(value) -> Date:
+    if isinstance(value, Date):
+        return value
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(f'Invalid date: {value}')
+    return date
+
+
+def get_team_id(user) -> int:
+    """
+    Return the id of the user's team, or None when stats should cover all users.
+
+    Users authenticated through `backends.UserProfileBackend` have their
+    profile loaded already, so this doesn't query the database.
+    """
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.userprofile.team_id
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def get_team_id_for_update(user) -> int:
+    """
+    Return the id of the user's team as stored, locking the user's profile
+    until the end of the transaction. Writes tally the user's entries with
+    it, so that a concurrent team change either waits for them or is seen
+    by them, whatever team the request's user was loaded with.
+    """
+    return (
+        UserProfile.objects.select_for_update()
+        .filter(user_id=user.pk)
+        .values_list('team_id', flat=True)
+        .first()
+    )
 
 
 def get_happiness_tally(user, date: str) -> Dict[str, int]:
-    qs = Happiness.objects.filter(date=date)
-    if user.is_authenticated and user.userprofile.team_id:
-        qs = qs.filter(user__userprofile__team_id=user.userprofile.team_id)
+    return _get_tally(get_team_id(user), date)
+
+
+def _get_tally(team_id: int, date: Date) -> Dict[str, int]:
+    qs = HappinessTally.objects.filter(team_id=team_id, date=date, count__gt=0)
+    return dict(qs.order_by('level').values_list('level', 'count'))
+
+
+BUCKETS = {
+    'day': F('date'),
+    'week': TruncWeek('date'),
+    'month': TruncMonth('date'),
+}
+
+
+def get_stats_by_bucket(
+    user, start: Date, end: Date, bucket: str = 'day'
+) -> Iterator[Dict[str, any]]:
+    """
+    Yield the stats of each day, week or month from `start` to `end` that has
+    entries, in order, all computed in one grouped query over the tallies.
+    """
+    qs = (
+        HappinessTally.objects.filter(
+            team_id=get_team_id(user), date__range=(start, end), count__gt=0
+        )
+        .annotate(bucket=BUCKETS[bucket])
+        .values('bucket', 'level')
+        .annotate(count=Sum('count'))
+        .order_by('bucket', 'level')
+        .values_list('bucket', 'level', 'count')
+    )
+    for bucket_date, rows in groupby(qs.iterator(), key=lambda row: row[0]):
+        tally = {level: count for _, level, count in rows}
+        yield {'date': bucket_date, **describe_tally(tally)}
+
+
+def annotate_team_stats(teams: QuerySet, start: Date, end: Date) -> QuerySet:
+    """
+    Annotate each team with its number of entries per level from `start` to
+    `end`, so the stats of a page of teams take a single grouped query.
+
+    The period is part of the join, so that only the tallies of the period
+    are joined and grouped, however many days are stored.
+    """
+    period = Q(tallies__date__range=(start, end))
+    return teams.annotate(
+        period_tallies=FilteredRelation('tallies', condition=period)
+    ).annotate(
+        **{
+            f'level_{level}_count': Sum(
+                'period_tallies__count', filter=Q(period_tallies__level=level)
+            )
+            for level in LEVELS
+        }
+    )
+
+
+def get_team_tally(team) -> Dict[int, int]:
+    """
+    Return the tally of a team annotated by `annotate_team_stats`.
+    """
     return {
-        x['level']: x['count']
-        for x in qs.values('level')
-        .annotate(count=Count('level'))
-        .order_by('level')
-        .values('level', 'count')
+        level: getattr(team, f'level_{level}_count')
+        for level in LEVELS
+        if getattr(team, f'level_{level}_count')
     }
 
 
+PERCENTILES = (10, 25, 75, 90)
+
+
+def describe_tally(tally: Dict[int, int]) -> Dict[str, any]:
+    """
+    Return the stats of a tally of entries per level.
+
+    They're computed from the count of each level rather than from the
+    entries, so their cost doesn't grow with the number of entries.
+    """
+    return {
+        'tally': tally,
+        'average': get_average_happiness(tally),
+        'count': sum(tally.values()),
+        'median': get_median_happiness(tally),
+        'stddev': get_happiness_stddev(tally),
+        'percentiles': {
+            f'p{percentile}': get_happiness_percentile(tally, percentile)
+            for percentile in PERCENTILES
+        },
+    }
+
+
+def merge_tallies(tallies: Iterable[Dict[int, int]]) -> Dict[int, int]:
+    """
+    Combine tallies, such as those of the days of a week, into the tally of
+    the whole period, which `describe_tally` gives the stats of.
+    """
+    merged = Counter()
+    for tally in tallies:
+        merged.update(tally)
+    return {level: count for level, count in sorted(merged.items()) if count}
+
+
+def _get_ranked_level(tally: Dict[int, int], rank: int) -> int:
+    """
+    Return the level of the entry at a 1-based rank, by increasing level.
+    """
+    for level in sorted(tally):
+        rank -= tally[level]
+        if rank <= 0:
+            return level
+    raise ValueError('Rank out of the tally.')
+
+
+def get_median_happiness(tally: Dict[int, int]) -> float:
+    count = sum(tally.values())
+    if not count:
+        return None
+    low = _get_ranked_level(tally, (count + 1) // 2)
+    high = _get_ranked_level(tally, count // 2 + 1)
+    return (low + high) / 2
+
+
+def get_happiness_percentile(tally: Dict[int, int], percentile: int) -> int:
+    """
+    Return the level at a percentile by the nearest-rank method.
+    """
+    count = sum(tally.values())
+    if not count:
+        return None
+    return _get_ranked_level(tally, max(1, math.ceil(percentile * count / 100)))
+
+
+def get_happiness_stddev(tally: Dict[int, int]) -> float:
+    """
+    Return the population standard deviation of the levels.
+    """
+    count = sum(tally.values())
+    if not count:
+        return None
+    total = sum(level * level_count for level, level_count in tally.items())
+    squares = sum(level * level * level_count for level, level_count in tally.items())
+    # The variance is exact in integers until this division
+    return math.sqrt((count * squares - total * total) / (count * count))
+
+
+def get_participation(count: int, team_size: int) -> float:
+    """
+    Return the share of a team's members, out of `team_size`, who made the
+    `count` entries.
+    """
+    return count / team_size if team_size else None
+
+
 def get_average_happiness(tally: List[Dict[int, int]]) -> float:
     sum = 0
     count = 0
     for level, level_count in tally.items():
-        sum += level
+        sum += level * level_count
         count += level_count
     average = sum / count if count else None
     return average
@@ -39,6 +465,356 @@ def get_average_happiness(tally: List[Dict[int, int]]) -> float:
 
 def get_average_happiness_from_db(user, date: str) -> float:
     qs = Happiness.objects.filter(date=date)
-    if user.is_authenticated and user.userprofile.team_id:
-        qs = qs.filter(user__userprofile__team_id=user.userprofile.team_id)
+    team_id = get_team_id(user)
+    if team_id:
+        qs = qs.filter(user__userprofile__team_id=team_id)
     return qs.aggregate(Avg('level'))['level__avg']
+
+
+def upsert_happiness(user, date: Date, level: int) -> Dict[str, any]:
+    """
+    Create or replace the user's entry for the date, update the tallies, and
+    return the stats of the user's team as of the same transaction.
+    """
+    with transaction.atomic():
+        previous_level = _write_happiness(user, date, level)
+        team_id = get_team_id_for_update(user)
+        if previous_level != level:
+            changes = {(team_id, date, level): 1}
+            if previous_level is not None:
+                changes[(team_id, date, previous_level)] = -1
+            apply_tally_changes(changes)
+        # Read from the transaction and not cached, as it isn't committed yet
+        with use_primary():
+            stats = _compute_stats(team_id, date)
+            team_size = cache.get(_team_size_cache_key(team_id))
+            if team_size is None:
+                team_size = _cache_team_size(team_id)
+    return {**stats, 'participation': get_participation(stats['count'], team_size)}
+
+
+def _write_happiness(user, date: Date, level: int) -> int:
+    """
+    Set the level of the user's entry for the date, and return its previous
+    level, or None when the entry is created.
+
+    An existing entry is locked to read its level before it's updated, in a
+    single statement on Postgres. A missing one is inserted, unless another
+    request creates it meanwhile, in which case it's then updated.
+    """
+    connection = connections[router.db_for_write(Happiness)]
+    while True:
+        if connection.vendor == 'postgresql':
+            previous_level = _update_happiness_returning_level(
+                connection, user, date, level
+            )
+        else:
+            previous_level = _lock_happiness_level(connection, user, date)
+            if previous_level is not None and previous_level != level:
+                Happiness.objects.filter(user=user, date=date).update(level=level)
+        if previous_level is not None:
+            return previous_level
+        if insert_happiness([(user.pk, date, level)]):
+            return None
+
+
+def _lock_happiness_level(connection, user, date: Date) -> int:
+    """
+    Lock the user's entry for the date and return its level, or None when
+    there's none.
+
+    On SQLite, the lock is taken with an UPDATE that changes nothing, as a
+    transaction that starts with a read can't wait for a concurrent writer
+    and fails with "database is locked" instead.
+    """
+    entries = Happiness.objects.filter(user=user, date=date)
+    if connection.vendor != 'sqlite':
+        return entries.select_for_update().values_list('level', flat=True).first()
+    if not _supports_returning(connection):
+        entries.update(level=F('level'))
+        return entries.values_list('level', flat=True).first()
+    table = connection.ops.quote_name(Happiness._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET level = level WHERE user_id = %s AND date = %s '
+            'RETURNING level',
+            [user.pk, connection.ops.adapt_datefield_value(date)],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _update_happiness_returning_level(connection, user, date: Date, level: int) -> int:
+    table = connection.ops.quote_name(Happiness._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET level = %s FROM ('
+            f'SELECT id, level FROM {table} WHERE user_id = %s AND date = %s '
+            f'FOR UPDATE) AS previous WHERE {table}.id = previous.id '
+            'RETURNING previous.level',
+            [level, user.pk, connection.ops.adapt_datefield_value(date)],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# Rows per INSERT, within the 999 parameters of older SQLite versions
+INSERT_BATCH_SIZE = 300
+
+
+def insert_happiness(entries: Iterable[Tuple[int, Date, int]]) -> Set[Tuple]:
+    """
+    Insert the (user id, date, level) entries, except those of users who have
+    an entry for the date already, and return the (user id, date) of the
+    entries inserted, whatever concurrent writes insert meanwhile.
+    """
+    entries = list(entries)
+    connection = connections[router.db_for_write(Happiness)]
+    inserted = set()
+    if not _supports_returning(connection):
+        for user_id, date, level in entries:
+            try:
+                with transaction.atomic():
+                    Happiness.objects.create(user_id=user_id, date=date, level=level)
+            except IntegrityError:
+                continue
+            inserted.add((user_id, _as_date(date)))
+        return inserted
+
+    table = connection.ops.quote_name(Happiness._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(entries), INSERT_BATCH_SIZE):
+            batch = entries[start : start + INSERT_BATCH_SIZE]
+            values = ', '.join(['(%s, %s, %s)'] * len(batch))
+            params = []
+            for user_id, date, level in batch:
+                params += [user_id, connection.ops.adapt_datefield_value(date), level]
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, date, level) VALUES {values} '
+                'ON CONFLICT (user_id, date) DO NOTHING RETURNING user_id, date',
+                params,
+            )
+            inserted.update(
+                (user_id, _as_date(date)) for user_id, date in cursor.fetchall()
+            )
+    return inserted
+
+
+def _supports_returning(connection) -> bool:
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def adjust_tally(user, date: str, level: int, delta: int = 1) -> None:
+    """
+    Add `delta` entries of `level` on `date` to the tallies of the user's team
+    and of all users. Call it in the transaction that writes the entry.
+    """
+    apply_tally_changes({(get_team_id_for_update(user), date, level): delta})
+
+
+def apply_tally_changes(changes: Dict[Tuple[int, Date, int], int]) -> None:
+    """
+    Add the number of entries changed per (team id, date, level) to the
+    tallies of the team and of all users. Call it in the transaction that
+    writes the entries.
+    """
+    totals = Counter()
+    for (team_id, date, level), delta in changes.items():
+        date = _as_date(date)
+        if team_id:
+            totals[(team_id, date, level)] += delta
+        totals[(None, date, level)] += delta
+    for (team_id, date, level), delta in totals.items():
+        if delta:
+            _adjust_tally_row(team_id, date, level, delta)
+    changed = {(team_id, date) for team_id, date, level in totals}
+    _mark_snapshots_stale(changed)
+    invalidate_stats(changed)
+
+
+def _adjust_tally_row(team_id: int, date: str, level: int, delta: int) -> None:
+    rows = HappinessTally.objects.filter(team_id=team_id, date=date, level=level)
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            HappinessTally.objects.create(
+                team_id=team_id, date=date, level=level, count=delta
+            )
+    except IntegrityError:
+        # A concurrent write created the row after our update
+        rows.update(count=F('count') + delta)
+
+
+def rebuild_tallies(dates: Iterable = None) -> None:
+    """
+    Recompute the tallies from the happiness entries, for every date or only
+    for the given dates.
+    """
+    if dates is not None:
+        dates = list(dates)
+    counts = _count_entries(dates)
+    tallies = HappinessTally.objects.all()
+    if dates is not None:
+        tallies = tallies.filter(date__in=dates)
+    with use_primary(), transaction.atomic():
+        changed = set(tallies.values_list('team_id', 'date').distinct())
+        changed.update((team_id, date) for team_id, date, level in counts)
+        tallies.delete()
+        snapshots = StatsSnapshot.objects.filter(date__lt=now().date(), stale=False)
+        if dates is not None:
+            snapshots = snapshots.filter(date__in=dates)
+        snapshots.update(stale=True)
+        invalidate_stats(changed)
+        HappinessTally.objects.bulk_create(
+            (
+                HappinessTally(team_id=team_id, date=date, level=level, count=count)
+                for (team_id, date, level), count in counts.items()
+            ),
+            batch_size=500,
+        )
+
+
+def _get_snapshot(team_id: int, date: Date) -> Dict[str, any]:
+    snapshots = StatsSnapshot.objects.filter(team_id=team_id, date=date, stale=False)
+    for stats in snapshots.values_list('stats', flat=True)[:1]:
+        stats = json.loads(stats)
+        stats['tally'] = {int(level): count for level, count in stats['tally'].items()}
+        return stats
+    return None
+
+
+def snapshot_stats(dates: Iterable = None) -> int:
+    """
+    Take the snapshots of the stats of every team, and of all users, on the
+    completed days that have entries but no fresh snapshot, for every date
+    or only for the given dates. Return the number of snapshots taken.
+
+    Missing snapshots are first created as stale. Then, for each day, the
+    stale ones are locked while the tallies are read, so that a concurrent
+    edit of the day either comes before and is included, or waits and marks
+    them stale again.
+    """
+    today = now().date()
+    tallies = HappinessTally.objects.filter(date__lt=today, count__gt=0)
+    snapshots = StatsSnapshot.objects.filter(date__lt=today)
+    if dates is not None:
+        dates = list(dates)
+        tallies = tallies.filter(date__in=dates)
+        snapshots = snapshots.filter(date__in=dates)
+
+    with use_primary():
+        keys = set(tallies.order_by().values_list('team_id', 'date').distinct())
+        keys.difference_update(snapshots.values_list('team_id', 'date'))
+        StatsSnapshot.objects.bulk_create(
+            (
+                StatsSnapshot(team_id=team_id, date=date, stale=True)
+                for team_id, date in keys
+            ),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        stale_dates = (
+            snapshots.filter(stale=True)
+            .order_by('date')
+            .values_list('date', flat=True)
+            .distinct()
+        )
+        taken = 0
+        for date in list(stale_dates):
+            taken += _snapshot_day(date)
+        horizon = _get_snapshot_horizon()
+    cache.set(_SNAPSHOT_HORIZON_CACHE_KEY, horizon, None)
+    return taken
+
+
+def _get_snapshot_horizon() -> Date:
+    """
+    Return the last date with stats snapshots, or `Date.min` without any.
+
+    Every snapshotted day has a snapshot of all users. Only those are read,
+    through the (team, date) index, rather than the snapshots of every team.
+    """
+    snapshots = StatsSnapshot.objects.filter(team__isnull=True)
+    return snapshots.aggregate(horizon=Max('date'))['horizon'] or Date.min
+
+
+def _load_snapshot_horizon() -> Date:
+    horizon = _get_snapshot_horizon()
+    # Added rather than set, so as not to replace a horizon that
+    # `snapshot_stats` has just stored
+    cache.add(_SNAPSHOT_HORIZON_CACHE_KEY, horizon, None)
+    return horizon
+
+
+def _snapshot_day(date: Date) -> int:
+    with transaction.atomic():
+        snapshots = list(
+            StatsSnapshot.objects.select_for_update().filter(date=date, stale=True)
+        )
+        tallies = {}
+        rows = HappinessTally.objects.filter(date=date, count__gt=0).order_by('level')
+        for team_id, level, count in rows.values_list('team_id', 'level', 'count'):
+            tallies.setdefault(team_id, {})[level] = count
+        for snapshot in snapshots:
+            stats = describe_tally(tallies.get(snapshot.team_id, {}))
+            snapshot.stats = json.dumps(stats, separators=(',', ':'))
+            snapshot.stale = False
+        StatsSnapshot.objects.bulk_update(snapshots, ['stats', 'stale'], batch_size=500)
+    return len(snapshots)
+
+
+def _mark_snapshots_stale(keys: Iterable[Tuple[int, Date]]) -> None:
+    today = now().date()
+    condition = Q()
+    for team_id, date in keys:
+        if date < today:
+            condition |= Q(team_id=team_id, date=date)
+    if condition:
+        StatsSnapshot.objects.filter(condition, stale=False).update(stale=True)
+
+
+def find_tally_mismatches(dates: Iterable = None) -> List[Tuple]:
+    """
+    Compare the tallies against the happiness entries.
+
+    Return a list of `(team_id, date, level, expected, actual)` for every tally
+    that differs, where a team id of None stands for all users.
+    """
+    if dates is not None:
+        dates = list(dates)
+    expected = _count_entries(dates)
+    tallies = HappinessTally.objects.exclude(count=0)
+    if dates is not None:
+        tallies = tallies.filter(date__in=dates)
+    actual = Counter()
+    with use_primary():
+        for team_id, date, level, count in tallies.values_list(
+            'team_id', 'date', 'level', 'count'
+        ).iterator():
+            actual[(team_id, date, level)] += count
+    mismatches = [
+        (*key, expected[key], actual[key])
+        for key in expected.keys() | actual.keys()
+        if expected[key] != actual[key]
+    ]
+    return sorted(mismatches, key=lambda x: (x[1], x[0] or 0, x[2]))
+
+
+def _count_entries(dates: List = None) -> Counter:
+    qs = Happiness.objects.all()
+    if dates is not None:
+        qs = qs.filter(date__in=dates)
+    counts = Counter()
+    for team_id, date, level, count in (
+        qs.values_list('user__userprofile__team_id', 'date', 'level')
+        .annotate(count=Count('id'))
+        .order_by()
+        .iterator()
+    ):
+        if team_id:
+            counts[(team_id, date, level)] += count
+        counts[(None, date, level)] += count
+    return counts
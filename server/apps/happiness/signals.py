@@ -1,8 +1,14 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
-from .models import UserProfile
+from rest_framework.authtoken.models import Token
+
+from .authentication import evict_token, evict_user_tokens
+from .models import Happiness, UserProfile
+from .services import invalidate_team_sizes, rebuild_tallies
 
 
 User = get_user_model()
@@ -12,3 +18,67 @@ User = get_user_model()
 def create_userprofile_for_user(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(pk=instance.id, user=instance)
+
+
+@receiver(post_save, sender=User)
+def evict_tokens_of_changed_user(sender, instance, created, update_fields, **kwargs):
+    # Logging in only updates the last login
+    if not created and update_fields != frozenset(['last_login']):
+        evict_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    evict_token(instance.key)
+
+
+@receiver(pre_delete, sender=User)
+def remember_happiness_dates_of_user(sender, instance, **kwargs):
+    instance._happiness_dates = list(
+        Happiness.objects.filter(user=instance).values_list('date', flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def update_tallies_for_deleted_user(sender, instance, **kwargs):
+    if getattr(instance, '_happiness_dates', None):
+        rebuild_tallies(instance._happiness_dates)
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_previous_team(sender, instance, **kwargs):
+    instance._previous_team_id = (
+        UserProfile.objects.filter(pk=instance.pk)
+        .values_list('team_id', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=UserProfile)
+def move_tallies_to_new_team(sender, instance, created, **kwargs):
+    if created:
+        invalidate_team_sizes([instance.team_id, None])
+    if created or instance.team_id == instance._previous_team_id:
+        return
+    invalidate_team_sizes([instance._previous_team_id, instance.team_id])
+    dates = list(
+        Happiness.objects.filter(user_id=instance.user_id).values_list(
+            'date', flat=True
+        )
+    )
+    if dates:
+        rebuild_tallies(dates)
+
+
+@receiver(post_delete, sender=UserProfile)
+def update_team_sizes_for_deleted_profile(sender, instance, **kwargs):
+    invalidate_team_sizes([instance.team_id, None])
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,33 @@
+from django.core.cache import caches
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+
+class LocalCacheThrottleMixin:
+    """
+    Keep the request history in the `throttle` cache, which is local to the
+    process, so that throttling doesn't add a round trip to a shared cache.
+    Each process then allows the full rate.
+    """
+
+    cache = caches['throttle']
+
+
+class AnonThrottle(LocalCacheThrottleMixin, AnonRateThrottle):
+    """ Limit the requests of anonymous users, per IP address. """
+
+
+class UserThrottle(LocalCacheThrottleMixin, UserRateThrottle):
+    """ Limit the requests of authenticated users, per user. """
+
+
+class WriteThrottle(LocalCacheThrottleMixin, UserRateThrottle):
+    """ Limit the writes of each user, on top of their overall rate. """
+
+    scope = 'write'
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        return super().allow_request(request, view)
@@ -1,17 +1,73 @@
-from dateutil.parser import parse as parse_date
+import queue
+import time
+from datetime import date as Date
 
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from django.db.utils import IntegrityError
-from django.http import Http404
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from django.utils.timezone import now
 
-from rest_framework import status, viewsets
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.pagination import CursorPagination
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from .models import Happiness
-from .serializers import HappinessSerializer
-from .services import get_stats
+from .events import get_broker
+from .metrics import render_metrics
+from .models import Happiness, Team
+from .parsers import CSVRecordParser, JSONLinesRecordParser
+from .renderers import EventStreamRenderer
+from .routers import use_primary
+from .serializers import (
+    ExportSerializer,
+    HappinessSerializer,
+    StatsPeriodSerializer,
+    StatsRangeSerializer,
+    TeamStatsSerializer,
+)
+from .services import (
+    adjust_tally,
+    annotate_team_stats,
+    apply_tally_changes,
+    get_stats,
+    get_stats_by_bucket,
+    get_stats_cache_counters,
+    get_stats_version,
+    get_team_id,
+    get_team_id_for_update,
+    get_team_stats,
+    get_team_stats_and_version,
+    stats_topic,
+    upsert_happiness,
+)
+
+
+STREAMING_RANGE_DAYS = 92
+
+
+class HistoryPagination(CursorPagination):
+    ordering = '-date'
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 366
 
 
 class HappinessViewSet(viewsets.ModelViewSet):
@@ -21,42 +77,46 @@ class HappinessViewSet(viewsets.ModelViewSet):
     serializer_class = HappinessSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     lookup_field = 'date'
+    # Only canonical dates are routed, so that each date has a single URL
+    lookup_value_regex = r'\d{4}-\d{2}-\d{2}'
 
-    def get_object(self):
-        date = self.kwargs.get('date')
-        if date:
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if 'date' in self.kwargs:
+            # The handler gets the same kwargs, so it gets the date parsed
             try:
-                parse_date(date)
-            except ValueError as e:
+                self.kwargs['date'] = Date.fromisoformat(self.kwargs['date'])
+            except ValueError:
                 raise ValidationError('Invalid date provided.')
-        else:
-            date = now().date()
+
+    def get_object(self):
+        date = self.kwargs.get('date') or now().date()
         obj = Happiness.objects.filter(user=self.request.user, date=date).first()
         if not obj:
-            if self.action == 'update':
-                return Happiness(user=self.request.user, date=date)
-            else:
-                raise Http404
+            raise Http404
         return obj
 
     def list(self, request):
         """
         Return stats for today.
         """
-        return Response(get_stats(request.user))
+        return self.stats_response(now().date())
 
     def create(self, request):
         """
         Create entry for user's happiness level for today and return stats.
         """
-        response = super().create(request)
-        response.data = get_stats(request.user)
+        with use_primary():
+            response = super().create(request)
+            response.data = get_stats(request.user)
         return response
 
     def perform_create(self, serializer):
         today = now().date()
         try:
-            serializer.save(user=self.request.user, date=today)
+            with transaction.atomic():
+                happiness = serializer.save(user=self.request.user, date=today)
+                adjust_tally(self.request.user, today, happiness.level)
         except IntegrityError as e:
             raise ValidationError(
                 'You have already submitted your happiness level for today.'
@@ -66,16 +126,254 @@ class HappinessViewSet(viewsets.ModelViewSet):
         """
         Retrieve stats for the date.
         """
-        try:
-            parse_date(date)
-        except ValueError as e:
-            raise ValidationError('Invalid date provided.')
-        return Response(get_stats(request.user, date))
+        return self.stats_response(date)
+
+    def stats_response(self, date):
+        """
+        Return the stats of the user's team for the date, or a 304 response
+        when they match the ETag of the `If-None-Match` header.
+
+        The ETag is derived from the version of the cached stats, so checking
+        it doesn't compute them. Past days rarely change, so their stats may
+        be cached by clients for HAPPINESS_PAST_STATS_MAX_AGE seconds, while
+        today's have to be revalidated.
+        """
+        team_id = get_team_id(self.request.user)
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        version = get_stats_version(team_id, date) if if_none_match else None
+        if version and self.stats_etag(version) in parse_etags(if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            stats, version = get_team_stats_and_version(team_id, date)
+            response = Response(stats)
+        response['ETag'] = self.stats_etag(version)
+        if date < now().date():
+            patch_cache_control(
+                response, private=True, max_age=settings.HAPPINESS_PAST_STATS_MAX_AGE
+            )
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Authorization', 'Cookie'])
+        return response
+
+    def stats_etag(self, version):
+        # Stats are rendered as JSON or as the browsable API's HTML
+        return f'"{version}-{self.request.accepted_renderer.format}"'
 
     def update(self, request, date=None, *args, **kwargs):
         """
-        Replace or partially update the user's entry for the date and return stats.
+        Create or replace the user's entry for the date and return stats.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        level = serializer.validated_data['level']
+        return Response(upsert_happiness(request.user, date, level))
+
+    def partial_update(self, request, date=None, *args, **kwargs):
+        """
+        Update the user's existing entry for the date and return stats.
+        """
+        with use_primary():
+            response = super().update(request, date, *args, partial=True, **kwargs)
+            response.data = get_stats(request.user, date)
+        return response
+
+    def perform_update(self, serializer):
+        previous_level = serializer.instance.level
+        with transaction.atomic():
+            happiness = serializer.save()
+            if happiness.level != previous_level:
+                team_id = get_team_id_for_update(self.request.user)
+                apply_tally_changes(
+                    {
+                        (team_id, happiness.date, previous_level): -1,
+                        (team_id, happiness.date, happiness.level): 1,
+                    }
+                )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            adjust_tally(self.request.user, instance.date, instance.level, -1)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[IsAdminUser],
+        parser_classes=[JSONParser, CSVRecordParser, JSONLinesRecordParser],
+    )
+    def bulk(self, request):
+        """
+        Create or update the entries of any users from records with a
+        username, date and level, sent as a JSON list, JSON lines or CSV.
+        """
+        # Imported on first use rather than when workers start, as most
+        # requests don't need it, like the exports below
+        from .ingest import DEFAULT_CHUNK_SIZE, import_happiness
+
+        records = request.data
+        if isinstance(records, dict):
+            raise ValidationError('Expected a list of records.')
+        chunk_size = serializers.IntegerField(min_value=1).run_validation(
+            request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE)
+        )
+        return Response(import_happiness(records, chunk_size))
+
+    @action(detail=False, permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream the entries of all users, or of a `?team=`, from `?start=` to
+        `?end=`, as `?output=csv` or `columnar`, gzipped with `?gzip=1`.
         """
-        response = super().update(request, date, *args, **kwargs)
-        response.data = get_stats(request.user, date)
+        from .exports import (
+            CONTENT_TYPES,
+            EXTENSIONS,
+            WRITERS,
+            export_rows,
+            gzip_stream,
+        )
+
+        params = ExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        output = params.validated_data['output']
+        rows = export_rows(
+            params.validated_data.get('team'),
+            params.validated_data.get('start'),
+            params.validated_data.get('end'),
+        )
+        content = WRITERS[output](rows)
+        content_type = CONTENT_TYPES[output]
+        filename = f'happiness.{EXTENSIONS[output]}'
+        if params.validated_data['gzip']:
+            content = gzip_stream(content)
+            content_type = 'application/gzip'
+            filename += '.gz'
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
+
+    @action(detail=False, url_path='range', url_name='range')
+    def stats_range(self, request):
+        """
+        Return stats per day, week or month for `?start=&end=&bucket=`.
+
+        Long ranges are streamed instead of being built in memory.
+        """
+        params = StatsRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start, end, bucket = (
+            params.validated_data[key] for key in ('start', 'end', 'bucket')
+        )
+        stats = get_stats_by_bucket(request.user, start, end, bucket)
+        head = {'start': start, 'end': end, 'bucket': bucket}
+        if (end - start).days < STREAMING_RANGE_DAYS:
+            return Response({**head, 'stats': list(stats)})
+        return StreamingHttpResponse(
+            _stream_json_list(head, 'stats', stats), content_type='application/json'
+        )
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=HistoryPagination,
+    )
+    def history(self, request):
+        """
+        List the user's own entries, latest first, by pages of a date cursor.
+        """
+        # Plain dicts of the two fields skip building and serializing models
+        entries = Happiness.objects.filter(user=request.user).values('date', 'level')
+        return self.get_paginated_response(self.paginate_queryset(entries))
+
+    @action(detail=False, renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def events(self, request):
+        """
+        Stream today's stats as server-sent events, sending them again each
+        time they change.
+        """
+        response = StreamingHttpResponse(
+            _stream_stats_events(get_team_id(request.user), now().date()),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def _stream_stats_events(team_id, date):
+    """
+    Yield the current stats, then their updates until the stream is closed
+    or reaches HAPPINESS_EVENTS_MAX_DURATION, after which clients reconnect.
+    """
+    broker = get_broker()
+    topic = stats_topic(team_id, date)
+    subscription = broker.subscribe(topic)
+    try:
+        yield _stats_event(get_team_stats(team_id, date))
+        deadline = time.monotonic() + settings.HAPPINESS_EVENTS_MAX_DURATION
+        while time.monotonic() < deadline:
+            try:
+                stats = subscription.get(timeout=settings.HAPPINESS_EVENTS_KEEPALIVE)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+            else:
+                yield _stats_event(stats)
+    finally:
+        broker.unsubscribe(topic, subscription)
+
+
+def _stats_event(stats):
+    return f'event: stats\ndata: {DjangoJSONEncoder().encode(stats)}\n\n'
+
+
+class TeamStatsPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class TeamStatsViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    List the stats of every team for `?date=`, or from `?start=` to `?end=`.
+    """
+
+    queryset = Team.objects.all()
+    serializer_class = TeamStatsSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = TeamStatsPagination
+
+    def get_queryset(self):
+        params = StatsPeriodSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return annotate_team_stats(
+            super().get_queryset(),
+            params.validated_data['start'],
+            params.validated_data['end'],
+        )
+
+
+def _stream_json_list(head, key, items):
+    """
+    Yield the JSON of `head` with the `items` under `key`, one item at a time.
+    """
+    encoder = DjangoJSONEncoder()
+    yield encoder.encode(head)[:-1]
+    yield f'{", " if head else ""}"{key}": ['
+    for i, item in enumerate(items):
+        yield (', ' if i else '') + encoder.encode(item)
+    yield ']}'
+
+
+def metrics(request):
+    """
+    Return the metrics of this process in the Prometheus text format, to staff
+    users or to clients from METRICS_ALLOWED_IPS.
+    """
+    allowed_ip = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not (allowed_ip or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        render_metrics(get_stats_cache_counters()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,236 @@
+"""
+Query count, latency and allocation benchmarks of the happiness API.
+
+Run with:
+
+    python manage.py test benchmarks.api
+
+They run on the database set by DATABASE_URL, such as a local Postgres one.
+
+Each benchmark fails when it takes more queries than recorded in
+`baseline.json` for the database vendor, or when its p95 latency or peak
+allocation exceeds the baseline by more than BENCHMARK_THRESHOLD (0.5 by
+default). Set BENCHMARK_UPDATE_BASELINE=1 to record the current results as
+the baseline instead. The data size is set by BENCHMARK_TEAMS,
+BENCHMARK_USERS_PER_TEAM and BENCHMARK_DAYS, and timings are only compared
+against a baseline recorded for the same size.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now, timedelta
+
+from rest_framework.reverse import reverse
+
+from .data import seed
+
+
+User = get_user_model()
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+ITERATIONS = int(os.environ.get('BENCHMARK_ITERATIONS', 30))
+THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', 0.5))
+UPDATE_BASELINE = os.environ.get('BENCHMARK_UPDATE_BASELINE') == '1'
+SIZE = {
+    'teams': int(os.environ.get('BENCHMARK_TEAMS', 20)),
+    'users_per_team': int(os.environ.get('BENCHMARK_USERS_PER_TEAM', 25)),
+    'days': int(os.environ.get('BENCHMARK_DAYS', 90)),
+}
+
+
+class HappinessAPIBenchmarks(TestCase):
+
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(**SIZE)
+        cls.users = list(User.objects.filter(username__startswith='bench'))
+        cls.user = cls.users[0]
+        cls.staff = User.objects.create_user(
+            username='bench-staff', password='123', is_staff=True
+        )
+        cls.today = now().date()
+        cls.yesterday = cls.today - timedelta(days=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        _report(cls.results)
+        if UPDATE_BASELINE and cls.results:
+            baseline = _load_baseline()
+            baseline[connection.vendor] = {'size': SIZE, 'results': cls.results}
+            with open(BASELINE_PATH, 'w') as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+                f.write('\n')
+
+    def measure(self, name: str, request: Callable, prepare: Callable = None):
+        """
+        Time `request(i)` over the iterations with an empty cache, after
+        running `prepare(i)` untimed, then compare it with the baseline.
+        """
+        timings = []
+        queries = 0
+        for i in range(ITERATIONS + 1):
+            if prepare:
+                prepare(i)
+            cache.clear()
+            caches['throttle'].clear()
+            if i == ITERATIONS:
+                # One more run to measure allocations, which slows it down
+                tracemalloc.start()
+                request(i)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                break
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = request(i)
+                timings.append(time.perf_counter() - start)
+            self.assertLess(response.status_code, 400, name)
+            queries = max(queries, len(context.captured_queries))
+
+        result = {
+            'queries': queries,
+            'p50_ms': round(statistics.median(timings) * 1000, 3),
+            'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+            'peak_kib': round(peak / 1024, 1),
+        }
+        self.results[name] = result
+        if not UPDATE_BASELINE:
+            self.assert_within_baseline(name, result)
+
+    def assert_within_baseline(self, name: str, result: Dict[str, float]):
+        baseline = _load_baseline().get(connection.vendor)
+        if not baseline or name not in baseline['results']:
+            return
+        expected = baseline['results'][name]
+        self.assertLessEqual(
+            result['queries'], expected['queries'], f'{name} takes more queries'
+        )
+        if baseline['size'] != SIZE:
+            return
+        for key in ('p95_ms', 'peak_kib'):
+            self.assertLessEqual(
+                result[key],
+                expected[key] * (1 + THRESHOLD),
+                f'{name} regressed in {key}',
+            )
+
+    def test_list_anonymous(self):
+        self.measure(
+            'list_anonymous', lambda i: self.client.get(reverse('happiness-list'))
+        )
+
+    def test_list(self):
+        self.client.force_login(self.user)
+        self.measure('list', lambda i: self.client.get(reverse('happiness-list')))
+
+    def test_retrieve(self):
+        self.client.force_login(self.user)
+        url = reverse('happiness-detail', [self.yesterday])
+        self.measure('retrieve', lambda i: self.client.get(url))
+
+    def test_create(self):
+        def prepare(i):
+            self.client.force_login(self.users[i])
+
+        self.measure(
+            'create',
+            lambda i: self.client.post(reverse('happiness-list'), {'level': 3}),
+            prepare,
+        )
+
+    def test_update(self):
+        self.client.force_login(self.user)
+        url = reverse('happiness-detail', [self.yesterday])
+        self.measure(
+            'update',
+            lambda i: self.client.put(
+                url, {'level': i % 5 + 1}, content_type='application/json'
+            ),
+        )
+
+    def test_partial_update(self):
+        self.client.force_login(self.user)
+        url = reverse('happiness-detail', [self.yesterday])
+        self.client.put(url, {'level': 1}, content_type='application/json')
+        self.measure(
+            'partial_update',
+            lambda i: self.client.patch(
+                url, {'level': i % 5 + 1}, content_type='application/json'
+            ),
+        )
+
+    def test_destroy(self):
+        self.client.force_login(self.user)
+        url = reverse('happiness-detail', [self.yesterday])
+
+        def prepare(i):
+            self.client.put(url, {'level': 3}, content_type='application/json')
+
+        self.measure('destroy', lambda i: self.client.delete(url), prepare)
+
+    def test_range(self):
+        self.client.force_login(self.user)
+        params = {
+            'start': self.today - timedelta(days=SIZE['days']),
+            'end': self.today,
+            'bucket': 'week',
+        }
+        self.measure(
+            'range',
+            lambda i: self.client.get(reverse('happiness-range'), params),
+        )
+
+    def test_team_stats(self):
+        self.client.force_login(self.staff)
+        self.measure(
+            'team_stats', lambda i: self.client.get(reverse('team-stats-list'))
+        )
+
+    def test_bulk(self):
+        self.client.force_login(self.staff)
+        records = [
+            {'username': user.username, 'date': str(self.yesterday), 'level': 4}
+            for user in self.users[:100]
+        ]
+        self.measure(
+            'bulk',
+            lambda i: self.client.post(
+                reverse('happiness-bulk'), records, content_type='application/json'
+            ),
+        )
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def _load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def _report(results):
+    sys.stderr.write(f'\n{"benchmark":<20}{"queries":>8}{"p50 ms":>10}')
+    sys.stderr.write(f'{"p95 ms":>10}{"peak KiB":>10}\n')
+    for name, result in sorted(results.items()):
+        sys.stderr.write(
+            f'{name:<20}{result["queries"]:>8}{result["p50_ms"]:>10}'
+            f'{result["p95_ms"]:>10}{result["peak_kib"]:>10}\n'
+        )
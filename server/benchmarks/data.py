@@ -0,0 +1,71 @@
+"""
+Generate realistic happiness data for benchmarks.
+"""
+import random
+from typing import Dict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils.timezone import now, timedelta
+
+from apps.happiness.models import LEVELS, Happiness, Team, UserProfile
+from apps.happiness.services import rebuild_tallies
+
+
+User = get_user_model()
+
+PASSWORD = '123'
+
+
+def seed(
+    teams: int, users_per_team: int, days: int, participation: float = 0.8
+) -> Dict[str, int]:
+    """
+    Create `teams` teams of `users_per_team` users, each of which checked in
+    on about `participation` of the `days` days before today.
+    """
+    rng = random.Random(0)
+    today = now().date()
+    password = make_password(PASSWORD)
+
+    Team.objects.bulk_create(
+        (Team(name=f'Team {i}') for i in range(teams)), batch_size=500
+    )
+    team_ids = list(Team.objects.order_by('id').values_list('id', flat=True))
+
+    User.objects.bulk_create(
+        (
+            User(username=f'bench{i}', password=password)
+            for i in range(teams * users_per_team)
+        ),
+        batch_size=500,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith='bench')
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    UserProfile.objects.bulk_create(
+        (
+            UserProfile(pk=user_id, user_id=user_id, team_id=team_ids[i % teams])
+            for i, user_id in enumerate(user_ids)
+        ),
+        batch_size=500,
+    )
+
+    Happiness.objects.bulk_create(
+        (
+            Happiness(
+                user_id=user_id,
+                date=today - timedelta(days=day),
+                level=rng.choice(LEVELS),
+            )
+            for user_id in user_ids
+            for day in range(1, days + 1)
+            if rng.random() < participation
+        ),
+        batch_size=500,
+    )
+    rebuild_tallies()
+
+    return {'teams': teams, 'users_per_team': users_per_team, 'days': days}
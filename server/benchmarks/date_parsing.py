@@ -0,0 +1,51 @@
+"""
+Compare the cost of parsing the date of a stats URL the previous way, with
+dateutil then Django's parse_date, against routing it by regex and parsing
+it with date.fromisoformat.
+
+Usage:
+
+    python -m benchmarks.date_parsing
+
+The dateutil path is skipped when python-dateutil isn't installed, as it's
+no longer a requirement.
+"""
+import re
+import timeit
+from datetime import date
+
+from django.utils.dateparse import parse_date
+
+try:
+    from dateutil.parser import parse as dateutil_parse
+except ImportError:
+    dateutil_parse = None
+
+
+VALUE = '2019-09-27'
+ROUTE = re.compile(r'^(?P<date>\d{4}-\d{2}-\d{2})/$')
+
+
+def previous_path(value):
+    # Validated by dateutil, then parsed again to build the cache key
+    dateutil_parse(value)
+    return parse_date(value)
+
+
+def current_path(value):
+    return date.fromisoformat(ROUTE.match(value + '/').group('date'))
+
+
+def main():
+    paths = [('regex + fromisoformat', current_path)]
+    if dateutil_parse:
+        paths.insert(0, ('dateutil + parse_date', previous_path))
+    else:
+        print('python-dateutil is not installed, skipping the previous path')
+    for name, path in paths:
+        number, total = timeit.Timer(lambda: path(VALUE)).autorange()
+        print(f'{name:<24}{total / number * 1e9:>10.0f} ns per date')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure the throughput and latency of a running server under concurrent
+clients, to compare deployments of the API.
+
+Usage:
+
+    python -m benchmarks.load http://127.0.0.1:8000/api/v1/happiness/ \\
+        --concurrency 32 --duration 10
+"""
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run(url: str, concurrency: int, duration: float, headers: dict = None):
+    """
+    Request `url` from `concurrency` clients for `duration` seconds and
+    return the timings of successful requests and the number of errors.
+    """
+    deadline = time.perf_counter() + duration
+    timings = []
+    errors = 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal errors
+        request = urllib.request.Request(url, headers=headers or {})
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError):
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                timings.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+    return timings, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument(
+        '--header',
+        action='append',
+        default=[],
+        help='Header to send, such as "Cookie: sessionid=...". Can be repeated.',
+    )
+    args = parser.parse_args()
+    headers = dict(header.split(': ', 1) for header in args.header)
+
+    timings, errors = run(args.url, args.concurrency, args.duration, headers)
+    timings.sort()
+    print(f'clients:      {args.concurrency}')
+    print(f'requests:     {len(timings)} ({errors} errors)')
+    print(f'throughput:   {len(timings) / args.duration:.1f} requests/s')
+    if timings:
+        for name, fraction in [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]:
+            timing = timings[min(len(timings) - 1, int(fraction * len(timings)))]
+            print(f'{name} latency:  {timing * 1000:.1f} ms')
+        print(f'mean latency: {statistics.mean(timings) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Compare the throughput of concurrent check-ins and stats reads on a SQLite
+file, with and without the single-node tuning of SQLITE_TUNING.
+
+Usage:
+
+    python -m benchmarks.sqlite_stress --clients 16 --duration 10
+
+Each client is a process that alternately updates entries or reads stats
+through the test client, as a worker of a multi-process server would.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(args.clients, args.duration)
+        return
+
+    print(f'{"mode":<10}{"requests":>10}{"per second":>12}{"errors":>8}')
+    for tuning in ['0', '1']:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL='sqlite:///' + os.path.join(directory, 'db.sqlite3'),
+                CACHE_LOCATION=os.path.join(directory, 'cache'),
+                SLOW_QUERY_MS='',
+                SQLITE_TUNING=tuning,
+                THROTTLE_USER_RATE='',
+                THROTTLE_WRITE_RATE='',
+            )
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.sqlite_stress', '--worker']
+                + [f'--clients={args.clients}', f'--duration={args.duration}'],
+                env=env,
+                check=True,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+            ).stdout
+        requests, errors = map(int, output.split())
+        mode = 'tuned' if tuning == '1' else 'default'
+        print(
+            f'{mode:<10}{requests:>10}{requests / args.duration:>12.1f}{errors:>8}'
+        )
+
+
+def _run_worker(clients: int, duration: float):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
+    import django
+
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    # Allows the host of the test client, which is otherwise rejected with a
+    # 400 as ALLOWED_HOSTS is empty
+    setup_test_environment()
+
+    from apps.happiness.models import Team
+
+    call_command('migrate', verbosity=0)
+    team = Team.objects.create(name='Stress')
+    User = get_user_model()
+    users = [User.objects.create_user(f'stress{i}') for i in range(clients)]
+    clients = []
+    for user in users:
+        user.userprofile.team = team
+        user.userprofile.save()
+        # Logged in before the clients run, as logins write to the database
+        http = Client()
+        http.force_login(user)
+        clients.append(http)
+    connection.close()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.perf_counter() + duration
+    processes = [
+        context.Process(target=_run_client, args=(http, i % 2, deadline, results))
+        for i, http in enumerate(clients)
+    ]
+    for process in processes:
+        process.start()
+    totals = [0, 0]
+    for _ in processes:
+        requests, errors = results.get()
+        totals[0] += requests
+        totals[1] += errors
+    for process in processes:
+        process.join()
+    print(*totals)
+
+
+def _run_client(http, writer: bool, deadline: float, results):
+    from django.db import connection
+    from django.utils.timezone import now, timedelta
+
+    requests = errors = 0
+    while time.perf_counter() < deadline:
+        requests += 1
+        date = now().date() - timedelta(days=requests % 30)
+        try:
+            if writer:
+                response = http.put(
+                    f'/api/v1/happiness/{date}/',
+                    {'level': requests % 5 + 1},
+                    content_type='application/json',
+                )
+            else:
+                response = http.get(f'/api/v1/happiness/{date}/')
+            errors += not 200 <= response.status_code < 300
+        except Exception:
+            # Such as "database is locked", re-raised by the test client
+            errors += 1
+    connection.close()
+    results.put((requests, errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Measure the startup time of a worker, from its first import to its first
+response, and keep a history of the results to follow it over time.
+
+Usage:
+
+    python -m benchmarks.startup --runs 10 --record
+
+Each run starts a new interpreter that loads the WSGI application with the
+given settings (production ones by default) and serves today's stats from
+a SQLite database. With --record, the medians are appended to
+`startup_history.jsonl` along with the date and commit, marked `-dirty`
+when measuring uncommitted changes.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), 'startup_history.jsonl')
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import io, sys, time
+start = time.perf_counter()
+from config.wsgi import application
+loaded = time.perf_counter()
+statuses = []
+response = application(
+    {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': '/api/v1/happiness/',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    },
+    lambda status, headers, exc_info=None: statuses.append(status),
+)
+b''.join(response)
+response.close()
+print(loaded - start, time.perf_counter() - start, statuses[0])
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--settings', default='config.settings.prod')
+    parser.add_argument(
+        '--record', action='store_true', help='Append the results to the history.'
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            DATABASE_URL='sqlite:///' + os.path.join(directory, 'db.sqlite3'),
+            CACHE_LOCATION=os.path.join(directory, 'cache'),
+            DJANGO_SETTINGS_MODULE=args.settings,
+            DJANGO_SECRET_KEY='startup-benchmark',
+            DJANGO_ALLOWED_HOSTS='localhost',
+        )
+        subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '--verbosity=0'],
+            cwd=SERVER_DIR,
+            env=env,
+            check=True,
+        )
+        runs = [_run_worker(env) for _ in range(args.runs)]
+
+    result = {
+        'settings': args.settings,
+        'runs': args.runs,
+        'import_ms': _median_ms(run[0] for run in runs),
+        'first_response_ms': _median_ms(run[1] for run in runs),
+        'process_ms': _median_ms(run[2] for run in runs),
+    }
+    previous = _last_recorded(args.settings)
+    for key in ('import_ms', 'first_response_ms', 'process_ms'):
+        line = f'{key:<20}{result[key]:>10.1f}'
+        if previous:
+            line += f'{previous[key]:>10.1f} on {previous["date"]}'
+        print(line)
+
+    if args.record:
+        entry = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            **result,
+        }
+        with open(HISTORY_PATH, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+def _run_worker(env):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER],
+        cwd=SERVER_DIR,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    process = time.perf_counter() - start
+    loaded, responded, status = output.split(' ', 2)
+    if not status.startswith('200'):
+        sys.exit(f'The first request failed with {status}')
+    return float(loaded), float(responded), process
+
+
+def _median_ms(values):
+    return round(statistics.median(values) * 1000, 1)
+
+
+def _last_recorded(settings):
+    if not os.path.exists(HISTORY_PATH):
+        return None
+    with open(HISTORY_PATH) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries = [entry for entry in entries if entry['settings'] == settings]
+    return entries[-1] if entries else None
+
+
+def _commit():
+    """
+    Return the current commit, marked as dirty when the tracked files have
+    uncommitted changes, which the results then measure.
+    """
+    try:
+        commit = _git('rev-parse', '--short', 'HEAD')
+        if _git('status', '--porcelain', '--untracked-files=no'):
+            commit += '-dirty'
+        return commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _git(*args):
+    return subprocess.run(
+        ['git', *args],
+        cwd=SERVER_DIR,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Django settings for happiness project, shared by the settings of each
+environment: `dev`, `prod` and `test`.
+
+Generated by 'django-admin startproject' using Django 2.2.5.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+
+from ..database import parse_database_url
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'vpt&!k-bn#pzei-m4%*@nc6q%*z(d-w_39jy$$gq2t*$96%n6q'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+
+    'rest_framework',
+    'rest_framework.authtoken',
+
+    'apps.happiness.apps.HappinessConfig',
+]
+
+MIDDLEWARE = [
+    'apps.happiness.middleware.RequestMetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'config.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+# Configured by DATABASE_URL, and by a comma-separated DATABASE_REPLICA_URLS
+# of read replicas to send stats reads to. Connections are kept open for
+# DATABASE_CONN_MAX_AGE seconds.
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+DATABASES = {
+    'default': parse_database_url(
+        os.environ.get(
+            'DATABASE_URL', 'sqlite:///' + os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        DATABASE_CONN_MAX_AGE,
+    ),
+}
+
+DATABASE_REPLICAS = []
+
+replica_urls = os.environ.get('DATABASE_REPLICA_URLS', '')
+for i, url in enumerate(filter(None, replica_urls.split(','))):
+    alias = f'replica{i + 1}'
+    DATABASES[alias] = parse_database_url(url, DATABASE_CONN_MAX_AGE)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+if os.environ.get('DATABASE_TEST_NAME'):
+    DATABASES['default']['TEST'] = {'NAME': os.environ['DATABASE_TEST_NAME']}
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['apps.happiness.routers.ReplicaRouter']
+
+# With a transaction pooler such as PgBouncer in front of Postgres, set
+# DATABASE_DISABLE_SERVER_SIDE_CURSORS=1 so that iterating over large
+# querysets doesn't rely on cursors outliving a transaction.
+
+if os.environ.get('DATABASE_DISABLE_SERVER_SIDE_CURSORS') == '1':
+    for database in DATABASES.values():
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Pragmas applied to every new SQLite connection. SQLITE_TUNING=1 enables
+# the single-node mode, where writers and readers of a SQLite database
+# don't block each other, and writers wait for each other.
+
+SQLITE_PRAGMAS = {}
+
+if os.environ.get('SQLITE_TUNING') == '1':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# Writes invalidate the cached stats by bumping their version in the default
+# cache, so every process must share it. By default it's a file cache shared
+# by the processes of a host. Set CACHE_BACKEND and CACHE_LOCATION to use
+# another cache, such as memcached for several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Users of API tokens, local to the process. A deactivated user or
+    # deleted token may still authenticate in other processes until expiry.
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tokens',
+        'TIMEOUT': int(os.environ.get('TOKEN_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Sessions are read from the cache, and from the database on a miss
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db'
+)
+
+
+# REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+# API clients authenticate with a token, or with the session of the login
+# page. Throttle rates are requests per second, min, hour or day, such as
+# '100/min', where an empty rate disables the scope.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        # First, so unauthenticated requests keep getting a 403 without a
+        # WWW-Authenticate challenge
+        'rest_framework.authentication.SessionAuthentication',
+        'apps.happiness.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'apps.happiness.throttles.AnonThrottle',
+        'apps.happiness.throttles.UserThrottle',
+        'apps.happiness.throttles.WriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '120/min') or None,
+        'user': os.environ.get('THROTTLE_USER_RATE', '600/min') or None,
+        'write': os.environ.get('THROTTLE_WRITE_RATE', '60/min') or None,
+    },
+}
+
+
+# Authentication
+
+# ModelBackend still resolves the sessions logged in through it
+AUTHENTICATION_BACKENDS = [
+    'apps.happiness.backends.UserProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'America/Toronto'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+
+
+# Logging
+# https://docs.djangoproject.com/en/2.2/topics/logging/
+
+# Requests are logged at the INFO level, and slow queries at the WARNING level
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'apps.happiness.metrics.JSONFormatter',
+        },
+    },
+    'handlers': {
+        'json': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'apps.happiness.requests': {
+            'handlers': ['json'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'apps.happiness.slow_queries': {
+            'handlers': ['json'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Metrics
+
+# Addresses allowed to read /metrics without logging in, such as a scraper's
+METRICS_ALLOWED_IPS = [
+    ip.strip()
+    for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',')
+    if ip.strip()
+]
+
+
+# Auth URLS
+
+LOGIN_URL = '/api-auth/login/'
+LOGOUT_URL = '/api-auth/logout/'
+
+
+# Happiness
+
+HAPPINESS_STATS_CACHE_TIMEOUT = 60 * 60
+
+# Stats read from a replica may lag behind writes, so they're cached shortly
+HAPPINESS_REPLICA_STATS_CACHE_TIMEOUT = 10
+
+# Queries taking this many milliseconds or more are logged, unless it's empty
+slow_query_ms = os.environ.get('SLOW_QUERY_MS', '200')
+HAPPINESS_SLOW_QUERY_MS = float(slow_query_ms) if slow_query_ms else None
+
+# How long clients may reuse the stats of past days without revalidating them
+HAPPINESS_PAST_STATS_MAX_AGE = 24 * 60 * 60
+
+HAPPINESS_EVENT_BROKER = 'apps.happiness.events.LocalBroker'
+
+HAPPINESS_EVENTS_KEEPALIVE = 15
+
+HAPPINESS_EVENTS_MAX_DURATION = 5 * 60
+
+# Processes hashing the passwords of users provisioned from the admin. With 0
+# they're hashed in the web worker, rather than spawning processes per upload
+HAPPINESS_ADMIN_PROVISION_WORKERS = int(os.environ.get('ADMIN_PROVISION_WORKERS', '0'))
+
@@ -0,0 +1,20 @@
+"""
+Settings for development, with the debug toolbar.
+"""
+from .base import *  # noqa
+
+
+DEBUG = True
+
+
+# Debug Toolbar
+
+INSTALLED_APPS += [
+    'debug_toolbar',
+]
+MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+INTERNAL_IPS = [
+    'localhost',
+    '127.0.0.1',
+    '0.0.0.0',
+]
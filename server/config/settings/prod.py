@@ -0,0 +1,36 @@
+"""
+Settings for production, which take their secrets and hosts from the
+environment.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa
+
+
+DEBUG = False
+
+try:
+    SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+except KeyError:
+    raise ImproperlyConfigured('Set the DJANGO_SECRET_KEY environment variable.')
+
+# Writes only invalidate the stats cached by every worker through a shared cache
+if 'CACHE_LOCATION' not in os.environ:
+    raise ImproperlyConfigured(
+        'Set the CACHE_LOCATION environment variable to a cache shared by the '
+        'workers, along with CACHE_BACKEND unless it is a file cache directory.'
+    )
+if CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    raise ImproperlyConfigured('Set CACHE_BACKEND to a cache shared by the workers.')
+
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host.strip()
+]
+
+# Workers that only serve the API can leave out the admin, and its imports
+if os.environ.get('DJANGO_ADMIN') == '0':
+    INSTALLED_APPS.remove('django.contrib.admin')
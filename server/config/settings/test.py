@@ -0,0 +1,27 @@
+"""
+Settings for the test suite and benchmarks, which run on an in-memory
+SQLite database unless DATABASE_URL is set.
+"""
+import os
+
+from ..database import parse_database_url
+from .base import *  # noqa
+
+
+DEBUG = False
+
+if 'DATABASE_URL' not in os.environ:
+    DATABASES['default'] = parse_database_url('sqlite://')
+
+# Tests run in a single process, with a cache that starts empty
+CACHES['default'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'OPTIONS': {
+        'MAX_ENTRIES': 10000,
+    },
+}
+
+# Hashing passwords with a fast hasher speeds up creating and logging in users
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
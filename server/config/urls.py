@@ -13,29 +13,39 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.conf import settings
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 
+from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 
-from apps.happiness.views import HappinessViewSet
+from apps.happiness.views import HappinessViewSet, TeamStatsViewSet, metrics
 
 
 router = DefaultRouter()
 router.register('happiness', HappinessViewSet)
+router.register('team-stats', TeamStatsViewSet, basename='team-stats')
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-
     path('api-auth/', include('rest_framework.urls')),
 
+    path('api/v1/auth-token/', obtain_auth_token, name='auth-token'),
     path('api/v1/', include(router.urls)),
+
+    path('metrics', metrics, name='metrics'),
 ]
 
-if settings.DEBUG:
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns = [
+        path('admin/', admin.site.urls),
+    ] + urlpatterns
+
+if apps.is_installed('debug_toolbar'):
     import debug_toolbar
+
     urlpatterns = [
         path('__debug__/', include(debug_toolbar.urls)),
     ] + urlpatterns
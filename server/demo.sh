@@ -19,6 +19,7 @@ echo '--DONE--'
 
 printf  '\nLoading demo fixtures...\n'
 python manage.py loaddata happiness_demo
+python manage.py rebuild_tallies
 echo '--DONE--'
 
 printf  '\n\n'